@@ -1,6 +1,7 @@
 # app/core/config.py
 
 import os
+from functools import lru_cache
 from urllib.parse import urlparse, parse_qs, unquote, quote
 from dotenv import load_dotenv
 from typing import Tuple, Optional
@@ -28,6 +29,8 @@ IFRAME_SIZE: str = os.getenv("FANZA_IFRAME_SIZE", "1280_720").strip()
 
 # al.* の短縮ドメイン（これらは unwrap 対象）
 REDIRECT_HOSTS = {"al.dmm.com", "al.fanza.co.jp", "al.dmm.co.jp"}
+# str.endswith にそのまま渡せるよう tuple 化（1回の C 呼び出しで判定）
+_REDIRECT_SUFFIXES = tuple(REDIRECT_HOSTS)
 
 
 # ---- Size helpers ----------------------------------------------------------
@@ -46,25 +49,59 @@ def _parse_size(s: str) -> Tuple[int, int, float]:
 FANZA_IFRAME_W, FANZA_IFRAME_H, FANZA_IFRAME_RATIO = _parse_size(IFRAME_SIZE)
 
 
-# ---- Affiliate helpers -----------------------------------------------------
-def _is_aff_redirect(url: str) -> bool:
+# ---- URL helpers -----------------------------------------------------------
+# 同じURL（同じ作品/同じ画像）を何度もパースするので結果をキャッシュする
+# urlparse の戻り値は immutable な namedtuple なので共有して問題ない
+# （WHATWG パーサ ada_url は既定ポートの省略・空値の扱い等で urllib と結果が変わるので使わない）
+_parse_cached = lru_cache(maxsize=4096)(urlparse)
+
+
+@lru_cache(maxsize=4096)
+def _url_host(url: str) -> str:
+    """URL の netloc（小文字, port込み）。パース不能なら空文字。"""
+    try:
+        return _parse_cached(url).netloc.lower()
+    except Exception:
+        return ""
+
+
+@lru_cache(maxsize=4096)
+def _url_path(url: str) -> str:
+    """URL のパス部（生のまま。パーセントエンコードしない）。パース不能なら空文字。"""
     try:
-        host = urlparse(url).netloc.lower()
+        return _parse_cached(url).path
     except Exception:
-        return False
-    return any(host.endswith(h) for h in REDIRECT_HOSTS)
+        return ""
+
+
+def _url_query_first(url: str, key: str) -> Optional[str]:
+    """クエリ文字列から key の最初の値（デコード済み、空値は除く）を返す。無ければ None。"""
+    vals = parse_qs(_parse_cached(url).query).get(key, [])
+    return vals[0] if vals else None
+
+
+# ---- Affiliate helpers -----------------------------------------------------
+# アフィURLの固定部分は import 時に組み立てておき、make_aff_url では lurl だけ差し込む
+_AFF_PREFIX: str = f"{AFFILIATE_REDIRECT}/?lurl="
+_AFF_SUFFIX: str = f"&af_id={LINK_AFFILIATE_ID}" + (f"&ch={quote(AFFILIATE_CH, safe='')}" if AFFILIATE_CH else "")
+
+
+@lru_cache(maxsize=4096)
+def _is_aff_redirect(url: str) -> bool:
+    return _url_host(url).endswith(_REDIRECT_SUFFIXES)
 
 
+@lru_cache(maxsize=4096)
 def _extract_lurl(url: str) -> Optional[str]:
     """al.* の lurl パラメータを取り出す（無ければ None）"""
     try:
-        q = parse_qs(urlparse(url).query)
-        vals = q.get("lurl", [])
-        return unquote(vals[0]) if vals else None
+        v = _url_query_first(url, "lurl")
+        return unquote(v) if v else None
     except Exception:
         return None
 
 
+@lru_cache(maxsize=4096)
 def _unwrap_aff_url(url: str, max_hops: int = 5) -> str:
     """
     al.* で多重ラップされている場合に中身（最終URL）を取り出す。
@@ -93,14 +130,16 @@ def make_aff_url(base: Optional[str]) -> str:
         return ""
 
     # 既存の al.* ラップを剥がす
-    final = _unwrap_aff_url(base)
+    # 大半は video.dmm.co.jp 等の素URLなので、al.* のホスト名を含まなければ URL パース自体を省く
+    low = base.lower()
+    if any(h in low for h in _REDIRECT_SUFFIXES):
+        final = _unwrap_aff_url(base)
+    else:
+        final = base
 
     # 包み直し（リンク用 affiliate_id を使用）
     if LINK_AFFILIATE_ID and AFFILIATE_REDIRECT:
-        aff = f"{AFFILIATE_REDIRECT}/?lurl={quote(final, safe='')}&af_id={LINK_AFFILIATE_ID}"
-        if AFFILIATE_CH:
-            aff += f"&ch={quote(AFFILIATE_CH, safe='')}"
-        return aff
+        return _AFF_PREFIX + quote(final, safe='') + _AFF_SUFFIX
 
     # 未設定時は素のURLを返す（安全フォールバック）
     return base
@@ -1,8 +1,9 @@
 # app/core/content_builder.py
 import os
+from functools import lru_cache
 from pathlib import Path
 from typing import Callable, Optional, Dict, Any, Tuple, List
-from jinja2 import Environment, FileSystemLoader, select_autoescape, TemplateNotFound
+from jinja2 import Environment, FileSystemLoader, FileSystemBytecodeCache, select_autoescape, TemplateNotFound
 import json
 from urllib.parse import quote_plus, urlsplit
 
@@ -11,6 +12,26 @@ try:
 except Exception:
     markdown2 = None
 
+# Jinja バイトコードキャッシュ（プロセスを跨いでテンプレのコンパイル結果を再利用）
+#   - FANZA_JINJA_BCC=0 で無効化（テンプレのデバッグ時など）
+#   - JINJA_BCC_DIR     : キャッシュ置き場（未指定なら Jinja 既定の per-uid 0700 一時ディレクトリ。
+#                         共有の固定パスだと他ユーザーが .cache を仕込めるので使わない）
+def _make_bytecode_cache() -> Optional[FileSystemBytecodeCache]:
+    if os.getenv("FANZA_JINJA_BCC", "1").strip().lower() in ("0", "false", "no", "off"):
+        return None
+    try:
+        bcc_dir = os.getenv("JINJA_BCC_DIR")
+        if not bcc_dir:
+            return FileSystemBytecodeCache()  # 所有者/パーミッションは Jinja が確認する
+        d = Path(bcc_dir) / "fanza_jinja_bcc"
+        d.mkdir(mode=0o700, parents=True, exist_ok=True)
+        return FileSystemBytecodeCache(directory=str(d))
+    except Exception:
+        # 書き込めない環境ではキャッシュ無しで動かす
+        return None
+
+_BYTECODE_CACHE = _make_bytecode_cache()
+
 
 def _search_roots() -> List[str]:
     """
@@ -43,6 +64,26 @@ def _register_filters(env: Environment) -> None:
     # 以前テンプレが使っていた urlsplit（netloc 等を取りたい場合に備えて）
     env.filters["urlsplit"] = urlsplit
 
+@lru_cache(maxsize=32)
+def _get_env(searchpath: Tuple[str, ...], autoescape: bool = True) -> Environment:
+    """
+    searchpath ごとに Environment を1つだけ作って使い回す。
+    ContentBuilder を何度作ってもテンプレのコンパイル結果（Environment 内キャッシュ）を共有できる。
+    - auto_reload=False : 実行中にテンプレは変わらない前提（毎回の mtime 確認を省く）
+    - cache_size=-1     : 読み込んだテンプレは追い出さない
+    """
+    env = Environment(
+        loader=FileSystemLoader(list(searchpath)),
+        autoescape=select_autoescape(["html", "xml"]) if autoescape else False,
+        trim_blocks=True,
+        lstrip_blocks=True,
+        auto_reload=False,
+        cache_size=-1,
+        bytecode_cache=_BYTECODE_CACHE,
+    )
+    _register_filters(env)
+    return env
+
 def _make_env_and_name(path_like: Optional[str]) -> Tuple[Optional[Environment], Optional[str]]:
     """
     path_like が None → (None, None)
@@ -59,16 +100,8 @@ def _make_env_and_name(path_like: Optional[str]) -> Tuple[Optional[Environment],
         p = p.expanduser().resolve()
         if not p.exists():
             raise FileNotFoundError(f"Template path not found: {p}")
-        search_dirs = [str(p.parent)]
         name = p.name
-        env = Environment(
-            loader=FileSystemLoader(search_dirs),
-            autoescape=select_autoescape(["html", "xml"]),
-            trim_blocks=True,
-            lstrip_blocks=True,
-        )
-        _register_filters(env)
-        return env, name
+        return _get_env((str(p.parent),)), name
 
     # ファイル名だけ → 複数の候補ディレクトリ＋/templates を試す
     roots = _search_roots()
@@ -80,15 +113,8 @@ def _make_env_and_name(path_like: Optional[str]) -> Tuple[Optional[Environment],
     # 重複除去
     search_dirs = list(dict.fromkeys(search_dirs))
 
-    env = Environment(
-        loader=FileSystemLoader(search_dirs),
-        autoescape=select_autoescape(["html", "xml"]),
-        trim_blocks=True,
-        lstrip_blocks=True,
-    )
-    _register_filters(env)
     name = path_like
-    return env, name
+    return _get_env(tuple(search_dirs)), name
 
 class ContentBuilder:
     def __init__(
@@ -130,19 +156,21 @@ class ContentBuilder:
                     f"MD template '{md_name}' not found. searchpath={getattr(self.md_env.loader, 'searchpath', [])}"
                 ) from e
 
+        # render() 毎の属性解決/分岐を減らすため、描画関数を束縛しておく
+        # （markdown2 の有無は上で確認済み）
+        self._md_render = self.md_template.render if self.md_template else None
+        self._html_render = self.template.render if self.template else None
+
     def render(self, item: Dict[str, Any]) -> str:
         html_parts = []
 
         # 1) .mdテンプレート → HTML
-        if self.md_template:
-            md_text = self.md_template.render(item=item)
-            if markdown2 is None:
-                raise RuntimeError("markdown2 が必要です。`pip install markdown2` を実行してください。")
-            html_parts.append(markdown2.markdown(md_text))
+        if self._md_render:
+            html_parts.append(markdown2.markdown(self._md_render(item=item)))
 
         # 2) .html.j2テンプレート
-        if self.template:
-            html_parts.append(self.template.render(item=item))
+        if self._html_render:
+            html_parts.append(self._html_render(item=item))
 
         # 3) prepend / append
         core_html = "".join(html_parts) if html_parts else ""
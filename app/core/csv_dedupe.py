@@ -1,5 +1,47 @@
-import csv, glob, os
-from pathlib import Path
+import csv, fnmatch, glob, json, os
+
+try:
+    import pyarrow as pa  # optional（大きいCSVの列読みをネイティブで行う）
+    import pyarrow.csv as pacsv
+except Exception:
+    pa = None
+    pacsv = None
+
+
+def _read_header(path) -> list[str]:
+    with open(path, "r", encoding="utf-8-sig", newline="") as f:
+        return [x or "" for x in (next(csv.reader(f), None) or [])]
+
+
+def _read_column_values(path, key, out: set[str] | None = None) -> set[str]:
+    """
+    CSV の key 列の値（空白除去・空以外）を集合で返す。pyarrow があればそちらで読む。
+    out を渡すとその集合へ直接追加する（ファイルごとの一時集合を作らない）。
+    """
+    if out is None:
+        out = set()
+    if pacsv is not None:
+        try:
+            table = pacsv.read_csv(
+                path,
+                read_options=pacsv.ReadOptions(use_threads=True),
+                # --outfile の content 列は改行入りのクォートセル（無いと列数エラー → csv で読み直しになる）
+                parse_options=pacsv.ParseOptions(newlines_in_values=True),
+                convert_options=pacsv.ConvertOptions(
+                    include_columns=[key],
+                    column_types={key: pa.string()},  # 数字だけの CID を int 化させない
+                ),
+            )
+            out.update(v.strip() for v in table.column(key).to_pylist() if v and v.strip())
+            return out
+        except Exception:
+            pass  # 列数が揃わない CSV 等は csv モジュールで読み直す
+    with open(path, "r", encoding="utf-8-sig", newline="") as f:
+        for row in csv.DictReader(f):
+            v = (row.get(key) or "").strip()
+            if v:
+                out.add(v)
+    return out
 
 def load_skip_cids(patterns, colname="cid"):
     """patterns: 文字列 or カンマ区切り or グロブ(例: data/*.csv)
@@ -24,77 +66,191 @@ def load_skip_cids(patterns, colname="cid"):
     for path in paths:
         try:
             # UTF-8(BOM含む)想定。必要なら cp932 等のフォールバック追加可
-            with open(path, "r", encoding="utf-8-sig", newline="") as f:
-                reader = csv.DictReader(f)
-                if colname not in reader.fieldnames:
-                    # "content_id" や "CID" などの別名がある場合のフォールバック
-                    alt = next((c for c in reader.fieldnames if c.lower() == "cid" or "content_id" in c.lower()), None)
-                    key = alt or colname
-                else:
-                    key = colname
-                for row in reader:
-                    v = (row.get(key) or "").strip()
-                    if v:
-                        skip.add(v)
+            fieldnames = _read_header(path)
+            if colname not in fieldnames:
+                # "content_id" や "CID" などの別名がある場合のフォールバック
+                alt = next((c for c in fieldnames if c.lower() == "cid" or "content_id" in c.lower()), None)
+                key = alt or colname
+            else:
+                key = colname
+            if key not in fieldnames:
+                continue
+            _read_column_values(path, key, out=skip)
         except Exception:
             # 壊れたCSVはスキップ（ログ出力は好みで）
             continue
     return skip
 
 
-def append_ledger(path, row_dict, field_order=None):
-    """処理済み行を台帳CSVに追記。pathが無ければヘッダ付きで新規作成。"""
-    os.makedirs(os.path.dirname(path), exist_ok=True)
-    is_new = not os.path.exists(path)
-    # フィールド順は固定化すると後々楽
-    fields = field_order or [
-        "cid","title","date","maker","actress","URL","image_large","sample_images","posted_at"
-    ]
-    with open(path, "a", encoding="utf-8-sig", newline="") as f:
-        w = csv.DictWriter(f, fieldnames=fields, extrasaction="ignore")
+# フィールド順は固定化すると後々楽
+LEDGER_FIELDS = (
+    "cid","title","date","maker","actress","URL","image_large","sample_images","posted_at"
+)
+
+
+class LedgerWriter:
+    """
+    台帳CSVへの追記をまとめて行うライター。
+    ファイルは最初の write() で1回だけ開き、close() まで開きっぱなしにする。
+    台帳は投稿済みの記録（次回の重複投稿防止）なので、FLUSH_EVERY 行ごと（既定は毎行）に OS へ書き出す。
+        with LedgerWriter(path) as lw:
+            lw.write(row)
+    """
+    FLUSH_EVERY = 1
+
+    def __init__(self, path, field_order=None):
+        self.path = path
+        self.fields = tuple(field_order or LEDGER_FIELDS)
+        self._f = None
+        self._w = None
+        self._unflushed = 0
+
+    def _open(self):
+        os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+        is_new = not os.path.exists(self.path)
+        self._f = open(self.path, "a", encoding="utf-8-sig", newline="")
+        self._w = csv.writer(self._f)
         if is_new:
-            w.writeheader()
-        w.writerow(row_dict)
+            self._w.writerow(self.fields)
+
+    def write(self, row_dict):
+        if self._w is None:
+            self._open()
+        self._w.writerow([row_dict.get(k, "") for k in self.fields])
+        self._unflushed += 1
+        if self._unflushed >= self.FLUSH_EVERY:
+            self._f.flush()
+            self._unflushed = 0
+
+    def close(self):
+        if self._f is not None:
+            self._f.close()
+            self._f = None
+            self._w = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+        return False
+
+
+def append_ledger(path, row_dict, field_order=None):
+    """処理済み行を台帳CSVに追記。pathが無ければヘッダ付きで新規作成。（単発用）"""
+    with LedgerWriter(path, field_order) as lw:
+        lw.write(row_dict)
+
+# 読み込み済みCSVのキャッシュ: path -> (mtime, size, cids)
+# 同じプロセスで何度スキャンしても、変更の無いファイルは stat() だけで済ませる
+_CSV_CACHE: dict[str, tuple[float, int, frozenset[str]]] = {}
+
+
+def _read_cids_from_csv(path) -> set[str] | None:
+    """CSV 1ファイルから CID 列を読む。列が推定できなければ None。"""
+    fns = _read_header(path)
+    if not fns:
+        return None
+    # 優先順に列名を推定
+    key = None
+    for cand in ("cid", "CID", "content_id", "ContentID", "contentId"):
+        if cand in fns:
+            key = cand
+            break
+    if not key:
+        # 小文字化して 'cid' を探す
+        lowers = {c.lower(): c for c in fns}
+        if "cid" in lowers:
+            key = lowers["cid"]
+    if not key:
+        # どうしても見つからなければこのCSVはスキップ
+        return None
+    return _read_column_values(path, key)
+
+
+# 出力ディレクトリごとの永続インデックス: ファイル名 -> (mtime, size, cids)
+# 次回起動時は変更の無いCSVを再パースせず、この JSON から CID を読む
+# （出力先は共有/同期フォルダのこともあるので pickle は使わない。形が違えば捨てて全件スキャン）
+SKIP_INDEX_NAME = ".skip_index.json"
+_SKIP_INDEX_VERSION = 1
+_LEGACY_SKIP_INDEX_NAME = ".skip_index.pkl"  # 旧形式。読まずに消す
+
+
+def _load_skip_index(out_dir: str) -> dict[str, tuple[float, int, frozenset[str]]]:
+    try:
+        with open(os.path.join(out_dir, SKIP_INDEX_NAME), "r", encoding="utf-8") as f:
+            doc = json.load(f)
+        if not isinstance(doc, dict) or doc.get("version") != _SKIP_INDEX_VERSION:
+            return {}
+        files = doc.get("files")
+        if not isinstance(files, dict):
+            return {}
+        idx = {}
+        for name, ent in files.items():
+            mtime, size, cids = ent  # 3要素でなければ ValueError → 全体を捨てる
+            if not (isinstance(mtime, (int, float)) and isinstance(size, int) and isinstance(cids, list)
+                    and all(isinstance(c, str) for c in cids)):
+                return {}
+            idx[name] = (float(mtime), size, frozenset(cids))
+        return idx
+    except Exception:
+        return {}  # 無い/壊れている/形が違う → 全件スキャン
+
+
+def _save_skip_index(out_dir: str, idx: dict[str, tuple[float, int, frozenset[str]]]):
+    path = os.path.join(out_dir, SKIP_INDEX_NAME)
+    tmp = path + ".tmp"
+    doc = {
+        "version": _SKIP_INDEX_VERSION,
+        "files": {name: [mtime, size, sorted(cids)] for name, (mtime, size, cids) in idx.items()},
+    }
+    try:
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump(doc, f, ensure_ascii=False, separators=(",", ":"))
+        os.replace(tmp, path)
+    except OSError:
+        pass  # 書けないディレクトリでも CID の読み込み自体は成功させる
+
 
 # NEW: 出力ディレクトリ配下のCSVを自動スキャンしてCID集合を作る
 def load_skip_cids_in_dir(out_dir: str, glob_pattern: str = "*.csv") -> set[str]:
     """
     out_dir 以下の CSV を総なめにして CID を集める。
     列名は優先的に 'cid'、無ければ 'content_id' 等のそれっぽい列を自動推定。
+    mtime/size が前回と同じファイルは再パースせずキャッシュ（プロセス内 + out_dir/.skip_index.json）を使う。
     """
     skip: set[str] = set()
     if not out_dir:
         return skip
-    p = Path(out_dir)
-    if not p.exists():
+    if not os.path.isdir(out_dir):
         return skip
 
-    paths = sorted(p.glob(glob_pattern))
-    for path in paths:
+    # 順序は集合には無関係なのでソートせず、scandir の DirEntry から直接拾う
+    with os.scandir(out_dir) as it:
+        entries = [(e.name, e.path) for e in it if e.is_file() and fnmatch.fnmatch(e.name, glob_pattern)]
+
+    saved = _load_skip_index(out_dir)
+    idx: dict[str, tuple[float, int, frozenset[str]]] = {}
+    for name, key in entries:
         try:
-            with open(path, "r", encoding="utf-8-sig", newline="") as f:
-                reader = csv.DictReader(f)
-                if not reader.fieldnames:
-                    continue
-                fns = [x or "" for x in reader.fieldnames]
-                # 優先順に列名を推定
-                key = None
-                for cand in ("cid", "CID", "content_id", "ContentID", "contentId"):
-                    if cand in fns:
-                        key = cand
-                        break
-                if not key:
-                    # 小文字化して 'cid' を探す
-                    lowers = {c.lower(): c for c in fns}
-                    if "cid" in lowers:
-                        key = lowers["cid"]
-                if not key:
-                    # どうしても見つからなければこのCSVはスキップ
-                    continue
-                for row in reader:
-                    v = (row.get(key) or "").strip()
-                    if v:
-                        skip.add(v)
+            st = os.stat(key)
+            cached = _CSV_CACHE.get(key) or saved.get(name)
+            if cached and cached[:2] == (st.st_mtime, st.st_size):
+                _CSV_CACHE[key] = cached
+                idx[name] = cached
+                skip |= cached[2]
+                continue
+            cids = _read_cids_from_csv(key)
+            if cids is None:
+                continue
+            _CSV_CACHE[key] = idx[name] = (st.st_mtime, st.st_size, frozenset(cids))
+            skip |= cids
         except Exception:
             continue
-    return skip
\ No newline at end of file
+    if idx != saved:
+        _save_skip_index(out_dir, idx)
+    try:
+        os.remove(os.path.join(out_dir, _LEGACY_SKIP_INDEX_NAME))
+    except OSError:
+        pass  # 無い（ほとんどの場合）/消せない → そのまま。中身は一切読まない
+    return skip
@@ -1,28 +1,61 @@
 # app/core/filters.py
 import re
 
-def _match_any(patterns, text):
-    return any(re.search(p, text or "", re.I) for p in (patterns or []))
+_FILTER_FIELDS = (
+    "include_maker", "exclude_maker",
+    "include_actress", "exclude_actress",
+    "include_genre", "exclude_genre",
+    "include_title", "exclude_title",
+    "include_cid_prefix", "exclude_cid_prefix",
+)
 
-def _check_field(text, includes, excludes):
-    if includes and not _match_any(includes, text):
+# 番号/名前付きグループに依存する書き方（後方参照・条件分岐・名前付きグループ）とインラインフラグ。
+# alternation に混ぜるとグループ番号がずれる/名前が衝突するので、該当パターンは単独でコンパイルする
+_SOLO_RE = re.compile(r"\\[1-9]|\(\?P[<=]|\(\?<(?![=!])|\(\?\(|\(\?[aiLmsux]+\)")
+
+def _compile_union(patterns):
+    """
+    パターン群を1本の alternation にまとめ、search 関数を返す（無ければ None）。
+    後方参照/名前付きグループ/インラインフラグ入りのパターンは結合せず個別にマッチする。
+    """
+    # 空文字 "" も残す（従来の re.search("", s) と同じく何にでもマッチする）
+    pats = [p for p in (patterns or []) if p is not None]
+    if not pats:
+        return None
+    solo = [p for p in pats if _SOLO_RE.search(p)]
+    fused = [p for p in pats if not _SOLO_RE.search(p)]
+    searches = []
+    if fused:
+        try:
+            searches.append(re.compile("|".join(f"(?:{p})" for p in fused), re.I).search)
+        except re.error:
+            solo += fused
+    searches += [re.compile(p, re.I).search for p in solo]
+    if len(searches) == 1:
+        return searches[0]
+    return lambda text: any(s(text) for s in searches)
+
+def _check_field(text, inc, exc):
+    text = text or ""
+    if inc and not inc(text):
         return False
-    if excludes and _match_any(excludes, text):
+    if exc and exc(text):
         return False
     return True
 
 def apply_filters(rows, args):
     """rows: normalize後の辞書配列（cid/title/maker/actress/genres/...）"""
+    # パターンは呼び出し毎に1回だけ、フィールド毎に1本の正規表現へまとめる
+    c = {name: _compile_union(getattr(args, name, None)) for name in _FILTER_FIELDS}
     out = []
     for r in rows:
-        if not _check_field(r.get("maker",""),   args.include_maker,   args.exclude_maker):   continue
-        if not _check_field(r.get("actress",""), args.include_actress, args.exclude_actress): continue
-        if not _check_field(r.get("genres",""),  args.include_genre,   args.exclude_genre):   continue
-        if not _check_field(r.get("title",""),   args.include_title,   args.exclude_title):   continue
+        if not _check_field(r.get("maker",""),   c["include_maker"],   c["exclude_maker"]):   continue
+        if not _check_field(r.get("actress",""), c["include_actress"], c["exclude_actress"]): continue
+        if not _check_field(r.get("genres",""),  c["include_genre"],   c["exclude_genre"]):   continue
+        if not _check_field(r.get("title",""),   c["include_title"],   c["exclude_title"]):   continue
 
         cid = r.get("cid","")
-        if args.include_cid_prefix and not _match_any(args.include_cid_prefix, cid): continue
-        if args.exclude_cid_prefix and _match_any(args.exclude_cid_prefix, cid):     continue
+        if not _check_field(cid, c["include_cid_prefix"], c["exclude_cid_prefix"]): continue
 
         out.append(r)
     return out
@@ -1,7 +1,23 @@
 # app/core/image_mirror.py
-import os, csv, io, hashlib, mimetypes, requests, re
+import os, csv, hashlib, mimetypes, requests, re, shutil, tempfile, threading, time
+from concurrent.futures import ThreadPoolExecutor
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
 from urllib.parse import urlparse
-from typing import Dict, List, Tuple, Optional, Any
+from typing import IO, Dict, List, Tuple, Optional, Any
+from app.core.config import _url_host, _url_path
+
+try:
+    import orjson  # optional（WP REST の JSON デコードを高速化）
+    _loads = orjson.loads
+except Exception:
+    import json
+    _loads = json.loads
+
+try:
+    from blake3 import blake3 as _hasher  # optional（SIMD 並列で高速）
+except Exception:
+    _hasher = hashlib.sha256  # 無ければ SHA-NI が効く sha256
 
 # 既存: IMAGE_MIRROR_MAP = "image_mirror_map.csv" を全サイト共通で使っていたため
 #      別WPサイトに投稿すると「Aサイトのdest_url」を流用して壊れることがあった。
@@ -19,13 +35,59 @@ from typing import Dict, List, Tuple, Optional, Any
 BASE_MAP_CSV = os.getenv("IMAGE_MIRROR_MAP", "image_mirror_map.csv")
 MAP_DIR = os.getenv("IMAGE_MIRROR_MAP_DIR", "").strip()
 TIMEOUT = (5, 30)  # connect, read
+CHUNK = 64 * 1024           # ダウンロードの読み出し単位
+SPOOL_MAX = 2_000_000       # これを超えるとディスクへ退避（メモリに画像を丸ごと抱えない）
+# 1作品あたりの画像ミラー並列数（ダウンロード/アップロードは I/O 待ちが支配的）
+MAX_WORKERS = max(1, int(os.getenv("IMAGE_MIRROR_WORKERS", "8") or 8))
+# 元画像のディスクキャッシュ（任意）。指定時は同じ URL を run をまたいで再ダウンロードしない
+#   - IMAGE_MIRROR_BLOB_DIR    : 置き場所（未指定なら無効）
+#   - IMAGE_MIRROR_BLOB_MAX_MB : 合計サイズ上限。超えたら古い（最終利用が前の）ものから消す
+BLOB_DIR = os.getenv("IMAGE_MIRROR_BLOB_DIR", "").strip()
+BLOB_MAX_BYTES = int(os.getenv("IMAGE_MIRROR_BLOB_MAX_MB", "1024") or 1024) * 1024 * 1024
+BLOB_EVICT_EVERY = 100      # 書き込みこの回数ごとに上限チェック（毎回ディレクトリを舐めない）
+BLOB_TMP_STALE_SEC = 3600   # これより古い .tmp は書きかけの残骸とみなして消す（書き込み中のものは残す）
+
+# cache_map / to_write をスレッド間で共有するためのロック
+_MAP_LOCK = threading.Lock()
+
+# ミラー用スレッドプール（作品ごとに作り直さず、プロセス内で1つを使い回す）
+_POOL: Optional[ThreadPoolExecutor] = None
+_POOL_LOCK = threading.Lock()
+
+
+def _get_pool() -> ThreadPoolExecutor:
+    global _POOL
+    if _POOL is None:
+        with _POOL_LOCK:
+            if _POOL is None:
+                _POOL = ThreadPoolExecutor(max_workers=MAX_WORKERS, thread_name_prefix="mirror")
+    return _POOL
+
+# 画像DL / WP REST 用の共有セッション（同一ホストへの TCP/TLS 接続を使い回す）
+_SESSION = requests.Session()
+_SESSION.headers.update({'User-Agent': 'Mozilla/5.0'})
+_ADAPTER = HTTPAdapter(
+    pool_connections=16,
+    pool_maxsize=32,   # MAX_WORKERS 並列でもプールが溢れない大きさ
+    max_retries=Retry(total=3, backoff_factor=0.3, status_forcelist=(429, 500, 502, 503, 504)),
+)
+_SESSION.mount("https://", _ADAPTER)
+_SESSION.mount("http://", _ADAPTER)
+
+# WP 接続情報（画像ごとに os.getenv しないよう import 時に確定）
+WP_BASE = (os.getenv("WP_URL") or "").strip().rstrip("/")
+WP_USER = os.getenv("WP_USER", "")
+WP_APP_PASS = os.getenv("WP_APP_PASS", "")
+
+
+# ファイル名に使えない文字（サイトキー用）
+_SITE_KEY_RE = re.compile(r"[^a-z0-9.\-_]+")
 
 
 def _sanitize_site_key(s: str) -> str:
     s = (s or "").strip().lower()
     # ファイル名に使えるように最低限サニタイズ
-    s = re.sub(r"[^a-z0-9.\-_]+", "_", s)
-    return s or "default"
+    return _SITE_KEY_RE.sub("_", s) or "default"
 
 
 def _get_wp_base_url(wp_client) -> str:
@@ -37,7 +99,7 @@ def _get_wp_base_url(wp_client) -> str:
         v = getattr(wp_client, attr, None)
         if isinstance(v, str) and v.strip().startswith("http"):
             return v.strip()
-    return (os.getenv("WP_URL") or "").strip()
+    return WP_BASE
 
 
 def _site_key_from_wp(wp_client) -> str:
@@ -91,17 +153,113 @@ def _load_map(path: str) -> Dict[str, Dict[str, str]]:
     return m
 
 
+# 読み込み済みマップ: path -> (mtime, size, map)
+# 作品ごとに CSV 全体を読み直さないよう、プロセス内で共有する
+_MAP_CACHE: Dict[str, Tuple[float, int, Dict[str, Dict[str, str]]]] = {}
+
+
+def _stat_key(path: str) -> Tuple[float, int]:
+    try:
+        st = os.stat(path)
+        return st.st_mtime, st.st_size
+    except OSError:
+        return 0.0, 0
+
+
+def get_cache(path: str) -> Dict[str, Dict[str, str]]:
+    """
+    path のマップを返す（初回だけ CSV を読む）。
+    外部でファイルが書き換えられた（mtime/size が変わった）時だけ読み直す。
+    返した dict は _mirror_one が直接更新し、_append_map で CSV へ追記する。
+    """
+    key = _stat_key(path)
+    cached = _MAP_CACHE.get(path)
+    if cached and cached[:2] == key:
+        return cached[2]
+    m = _load_map(path)
+    _MAP_CACHE[path] = (key[0], key[1], m)
+    return m
+
+
+MAP_FIELDS = ('src_url', 'dest_url', 'sha1', 'bytes')
+
+
+class MirrorMapWriter:
+    """
+    マップCSVへの追記をまとめて行うライター（作品ごとに open/close しない）。
+    ファイルは最初の write_rows() で1回だけ開き、FLUSH_EVERY 行ごとに flush、
+    close() で fsync まで行う。複数スレッドから write_rows() してよい。
+        with MirrorMapWriter(path) as mw:
+            mw.write_rows(rows)
+    """
+    FLUSH_EVERY = 50
+
+    def __init__(self, path: str):
+        self.path = path
+        self._f: Optional[IO[str]] = None
+        self._w = None
+        self._unflushed = 0
+        self._lock = threading.Lock()
+
+    def _open(self):
+        os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+        is_new = not os.path.exists(self.path)
+        self._f = open(self.path, 'a', newline='', encoding='utf-8')
+        self._w = csv.writer(self._f)
+        if is_new:
+            # 'sha1' 列は互換のため名前据え置き（中身は _hasher のダイジェスト）
+            self._w.writerow(MAP_FIELDS)
+
+    def write_rows(self, rows: List[Dict[str, str]]):
+        if not rows:
+            return
+        with self._lock:
+            if self._w is None:
+                self._open()
+            self._w.writerows([r.get(k, '') for k in MAP_FIELDS] for r in rows)
+            self._unflushed += len(rows)
+            if self._unflushed >= self.FLUSH_EVERY:
+                self._flush()
+
+    def _flush(self):
+        if self._f is None:
+            return
+        self._f.flush()
+        self._unflushed = 0
+        # 自分で追記した分はメモリ上のマップに反映済みなので、stat だけ更新して再読込を防ぐ
+        cached = _MAP_CACHE.get(self.path)
+        if cached:
+            _MAP_CACHE[self.path] = (*_stat_key(self.path), cached[2])
+
+    def flush(self):
+        with self._lock:
+            self._flush()
+
+    def close(self):
+        with self._lock:
+            if self._f is None:
+                return
+            self._flush()
+            try:
+                os.fsync(self._f.fileno())
+            except OSError:
+                pass
+            self._f.close()
+            self._f = None
+            self._w = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+        return False
+
+
 def _append_map(path: str, rows: List[Dict[str, str]]):
-    if not rows:
-        return
-    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
-    exists = os.path.exists(path)
-    with open(path, 'a', newline='', encoding='utf-8') as f:
-        w = csv.DictWriter(f, fieldnames=['src_url', 'dest_url', 'sha1', 'bytes'])
-        if not exists:
-            w.writeheader()
-        for r in rows:
-            w.writerow(r)
+    """マップCSVへ単発で追記（run 単位の MirrorMapWriter を使わない呼び出し用）。"""
+    with MirrorMapWriter(path) as mw:
+        mw.write_rows(rows)
 
 
 def _coerce_url(u: Any) -> Optional[str]:
@@ -130,28 +288,173 @@ def _split_samples(v: Any) -> List[str]:
     if isinstance(v, str):
         return [s for s in v.split("|") if s]
     if isinstance(v, (list, tuple)):
-        return [str(s).strip() for s in v if str(s).strip()]
+        return [u for u in (_coerce_url(s) for s in v) if u]
     return []
 
 
+# よく来る Content-Type は mimetypes を引かずに決め打ち（.jpe 等の揺れも無い）
+_CTYPE_EXT = {
+    'image/jpeg': '.jpg',
+    'image/jpg': '.jpg',
+    'image/png': '.png',
+    'image/webp': '.webp',
+    'image/gif': '.gif',
+    'image/avif': '.avif',
+}
+
+
 def _guess_ext(content_type: str, url_path: str) -> str:
-    ext = mimetypes.guess_extension((content_type or '').split(';')[0].strip()) or ''
-    if not ext:
-        lp = url_path.lower()
-        for cand in ('.jpg', '.jpeg', '.png', '.webp', '.gif', '.avif'):
-            if lp.endswith(cand):
-                return cand
-        return '.jpg'
+    ctype = (content_type or '').split(';')[0].strip().lower()
+    ext = _CTYPE_EXT.get(ctype)
+    if ext:
+        return ext
+    lp = url_path.lower()
+    for cand in ('.jpg', '.jpeg', '.png', '.webp', '.gif', '.avif'):
+        if lp.endswith(cand):
+            return cand
+    # 最後の手段だけ mimetypes
+    ext = mimetypes.guess_extension(ctype) or '.jpg'
     return '.jpg' if ext == '.jpe' else ext
 
 
-def _download(url: str) -> Tuple[bytes, str]:
-    headers = {'User-Agent': 'Mozilla/5.0', 'Referer': ''}  # no-referrer 相当
-    r = requests.get(url, headers=headers, timeout=TIMEOUT, stream=True)
-    r.raise_for_status()
-    data = r.content
-    ctype = r.headers.get('Content-Type', 'image/jpeg').split(';')[0].strip()
-    return data, ctype
+_BLOB_LOCK = threading.Lock()
+_blob_writes = 0
+
+
+def _blob_path(url: str) -> str:
+    key = hashlib.sha1(url.encode("utf-8")).hexdigest()
+    return os.path.join(BLOB_DIR, key[:2], key)
+
+
+def _blob_get(url: str) -> Optional[Tuple[IO[bytes], str, str, int]]:
+    """ディスクキャッシュにあれば _download と同じ形で返す。無ければ None。"""
+    path = _blob_path(url)
+    try:
+        with open(path + ".meta", encoding="utf-8") as f:
+            ctype, hashhex = f.read().split("\n")[:2]
+        fobj = open(path, "rb")
+    except (OSError, ValueError):
+        return None
+    n = os.fstat(fobj.fileno()).st_size
+    try:
+        os.utime(path)  # 最終利用時刻（追い出し順）を更新
+    except OSError:
+        pass
+    return fobj, ctype, hashhex, n
+
+
+def _blob_put(url: str, fobj: IO[bytes], ctype: str, hashhex: str) -> None:
+    """
+    ダウンロード済みの fobj をディスクキャッシュへ保存（.tmp → os.replace で原子的に）。
+    .meta を“有効”の印として最後に置く（本体の書き込みが失敗/中断したら .meta は無い＝ミス扱い）。
+    """
+    global _blob_writes
+    path = _blob_path(url)
+    tmp = f"{path}.{threading.get_ident()}.tmp"
+    meta_tmp = f"{path}.meta.{threading.get_ident()}.tmp"
+    try:
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        fobj.seek(0)
+        with open(tmp, "wb") as f:
+            shutil.copyfileobj(fobj, f, CHUNK)
+        with open(meta_tmp, "w", encoding="utf-8") as f:
+            f.write(f"{ctype}\n{hashhex}\n")
+        # 本体を差し替える間に古い .meta と新しい本体が組にならないよう、先に .meta を外す
+        try:
+            os.remove(path + ".meta")
+        except FileNotFoundError:
+            pass
+        os.replace(tmp, path)
+        os.replace(meta_tmp, path + ".meta")
+    except OSError as e:
+        for p in (tmp, meta_tmp):
+            try:
+                os.remove(p)
+            except OSError:
+                pass
+        print(f"[mirror] blob cache write skipped: {e}")
+    finally:
+        fobj.seek(0)
+    with _BLOB_LOCK:
+        _blob_writes += 1
+        if _blob_writes % BLOB_EVICT_EVERY == 1:
+            _blob_evict()
+
+
+def _blob_evict() -> None:
+    """
+    合計が BLOB_MAX_BYTES を超えていたら、最終利用が古い順に消す。
+    クラッシュ等で残った古い .tmp（書きかけ）もここで掃除する。
+    """
+    entries = []
+    total = 0
+    stale_before = time.time() - BLOB_TMP_STALE_SEC
+    try:
+        for sub in os.scandir(BLOB_DIR):
+            if not sub.is_dir():
+                continue
+            for e in os.scandir(sub.path):
+                if not e.is_file():
+                    continue
+                if e.name.endswith(".tmp"):
+                    try:
+                        if e.stat().st_mtime < stale_before:
+                            os.remove(e.path)
+                    except OSError:
+                        pass
+                    continue
+                if e.name.endswith(".meta"):
+                    continue
+                st = e.stat()
+                entries.append((st.st_mtime, st.st_size, e.path))
+                total += st.st_size
+    except OSError:
+        return
+    if total <= BLOB_MAX_BYTES:
+        return
+    entries.sort()
+    for _, size, path in entries:
+        for p in (path, path + ".meta"):
+            try:
+                os.remove(p)
+            except OSError:
+                pass
+        total -= size
+        if total <= BLOB_MAX_BYTES:
+            break
+
+
+def _download(url: str) -> Tuple[IO[bytes], str, str, int]:
+    """
+    画像をストリームで取得し、読みながらハッシュ（ファイル名の衝突回避用）を計算する。
+    返り値: (先頭に seek 済みの一時ファイル, content-type, hashhex, バイト数)
+    一時ファイルは呼び出し側で close すること。
+    BLOB_DIR 指定時はディスクキャッシュを先に見て、取得した分は保存しておく。
+    """
+    if BLOB_DIR:
+        hit = _blob_get(url)
+        if hit is not None:
+            return hit
+    headers = {'Referer': ''}  # no-referrer 相当（UA はセッション既定）
+    r = _SESSION.get(url, headers=headers, timeout=TIMEOUT, stream=True)
+    try:
+        r.raise_for_status()
+        ctype = r.headers.get('Content-Type', 'image/jpeg').split(';')[0].strip()
+        h = _hasher()
+        spool = tempfile.SpooledTemporaryFile(max_size=SPOOL_MAX)
+        n = 0
+        for chunk in r.iter_content(CHUNK):
+            if chunk:
+                h.update(chunk)
+                spool.write(chunk)
+                n += len(chunk)
+        spool.seek(0)
+    finally:
+        r.close()  # ソケットをプールへ返す
+    hashhex = h.hexdigest()
+    if BLOB_DIR:
+        _blob_put(url, spool, ctype, hashhex)
+    return spool, ctype, hashhex, n
 
 
 def _resolve_media_id_from_url(wp_client, dest_url: str) -> Optional[int]:
@@ -160,53 +463,119 @@ def _resolve_media_id_from_url(wp_client, dest_url: str) -> Optional[int]:
     - まず basename で /wp/v2/media?search= を叩き、
       source_url 完全一致を最優先で照合。
     """
-    if not dest_url:
-        return None
     try:
-        base = _get_wp_base_url(wp_client).rstrip("/")
-        user = os.getenv("WP_USER", "")
-        app  = os.getenv("WP_APP_PASS", "")
-        if not (base and user and app):
-            return None
-
-        fname = os.path.basename(urlparse(dest_url).path)
-        r = requests.get(
-            f"{base}/wp-json/wp/v2/media",
-            params={"search": fname, "per_page": 20},
-            auth=(user, app),
-            timeout=20
-        )
-        r.raise_for_status()
-        hits = r.json() or []
-        # 1) 完全一致
-        for m in hits:
-            su = str(m.get("source_url") or "")
-            if su.rstrip("/") == dest_url.rstrip("/"):
-                return int(m.get("id")) if m.get("id") is not None else None
-        # 2) basename 一致（派生サイズの可能性あり）
-        for m in hits:
-            su = str(m.get("source_url") or "")
-            if su.lower().endswith("/" + fname.lower()):
-                return int(m.get("id")) if m.get("id") is not None else None
+        return _search_media_id(wp_client, dest_url)
     except Exception:
-        pass
+        return None
+
+
+def _search_media_id(wp_client, dest_url: str) -> Optional[int]:
+    """_resolve_media_id_from_url の本体。通信エラー/5xx は例外のまま返す（“無い”と区別する）"""
+    if not dest_url:
+        return None
+    base = _get_wp_base_url(wp_client).rstrip("/")
+    user = WP_USER
+    app  = WP_APP_PASS
+    if not (base and user and app):
+        return None
+
+    fname = os.path.basename(_url_path(dest_url))
+    r = _SESSION.get(
+        f"{base}/wp-json/wp/v2/media",
+        params={"search": fname, "per_page": 20},
+        auth=(user, app),
+        timeout=20
+    )
+    r.raise_for_status()
+    hits = _loads(r.content) or []
+    # 1) 完全一致
+    for m in hits:
+        su = str(m.get("source_url") or "")
+        if su.rstrip("/") == dest_url.rstrip("/"):
+            return int(m.get("id")) if m.get("id") is not None else None
+    # 2) basename 一致（派生サイズの可能性あり）
+    for m in hits:
+        su = str(m.get("source_url") or "")
+        if su.lower().endswith("/" + fname.lower()):
+            return int(m.get("id")) if m.get("id") is not None else None
     return None
 
 
-def _wp_upload_from_url(src_url: str, filename: str, wp_client) -> tuple[Optional[int], Optional[str]]:
+def _resolve_media_ids_bulk(wp_client, dest_urls: List[str]) -> Dict[str, Optional[int]]:
+    """
+    複数の dest_url をまとめて attachment ID に解決する。
+    - 直近アップロード分を /wp/v2/media?per_page=100 で1回だけ取得し、ローカルで照合
+      （source_url 完全一致 → basename 一致）
+    - そこで見つからなかったものだけ個別に検索
+    - 個別検索が通信エラー/5xx で終わった分は返さない（確定した結果だけをキャッシュさせる）
+    """
+    out: Dict[str, Optional[int]] = {}
+    targets = [u for u in dict.fromkeys(dest_urls) if u]
+    if not targets:
+        return out
+
+    base = _get_wp_base_url(wp_client).rstrip("/")
+    if base and WP_USER and WP_APP_PASS:
+        try:
+            r = _SESSION.get(
+                f"{base}/wp-json/wp/v2/media",
+                params={"per_page": 100, "orderby": "date", "order": "desc", "_fields": "id,source_url"},
+                auth=(WP_USER, WP_APP_PASS),
+                timeout=20
+            )
+            r.raise_for_status()
+            by_url: Dict[str, int] = {}
+            by_name: Dict[str, int] = {}
+            for m in (_loads(r.content) or []):
+                if m.get("id") is None:
+                    continue
+                su = str(m.get("source_url") or "")
+                by_url.setdefault(su.rstrip("/"), int(m["id"]))
+                by_name.setdefault(su.rsplit("/", 1)[-1].lower(), int(m["id"]))
+            for u in targets:
+                mid = by_url.get(u.rstrip("/"))
+                if mid is None:
+                    mid = by_name.get(os.path.basename(_url_path(u)).lower())
+                if mid is not None:
+                    out[u] = mid
+        except Exception:
+            pass
+
+    # 一覧に無かった分（古いアップロード等）だけ個別に解決
+    for u in targets:
+        if u not in out:
+            try:
+                out[u] = _search_media_id(wp_client, u)
+            except Exception:
+                pass  # 一時的な失敗 → 次の作品で引き直す
+    return out
+
+
+def _wp_upload_from_url(
+    src_url: str,
+    filename: str,
+    wp_client,
+    blob: Optional[Tuple[IO[bytes], str]] = None,
+) -> tuple[Optional[int], Optional[str]]:
     """
     アップロードの結果として (media_id, source_url) を返す。
     - 既存の wp_client 実装が返す型（dict/int/str）すべてを吸収
     - media_id が取れない時は REST で解決を試みる
+    - blob=(file, content_type) を渡すと multipart 経路で再ダウンロードしない
     """
     media_id: Optional[int] = None
     source_url: Optional[str] = None
 
     # パスA: multipart 受けられるクライアント
     if hasattr(wp_client, "upload_media"):
-        b, ctype = _download(src_url)
-        files = {'file': (filename, io.BytesIO(b), ctype)}
-        res = wp_client.upload_media(files, data={"title": filename})
+        if blob is not None:
+            fobj, ctype = blob
+            fobj.seek(0)
+            res = wp_client.upload_media({'file': (filename, fobj, ctype)}, data={"title": filename})
+        else:
+            fobj, ctype, _, _ = _download(src_url)
+            with fobj:
+                res = wp_client.upload_media({'file': (filename, fobj, ctype)}, data={"title": filename})
         if isinstance(res, dict):
             media_id = res.get("id")
             source_url = res.get("source_url") or (res.get("guid", {}) or {}).get("rendered")
@@ -259,49 +628,59 @@ def _wp_upload_from_url(src_url: str, filename: str, wp_client) -> tuple[Optiona
     return None, None
 
 
+def _cached_dest(
+    url: str,
+    cache_map: Dict[str, Dict[str, str]],
+    expected_host: str,
+    host_prefixes: Tuple[str, ...],
+) -> Optional[str]:
+    """
+    CSVヒットなら dest_url を返す。ただし「別サイトのdest_url」を掴んでる可能性があるので host を検証する。
+    host_prefixes（"https://{host}/" 等）で前方一致すれば即OK、外れた時だけ URL を分解して比べる。
+    """
+    row = cache_map.get(url)
+    if not row:
+        return None
+    dest = (row.get('dest_url') or '').strip()
+    if not dest:
+        return None
+    if not expected_host or dest.lower().startswith(host_prefixes):
+        return dest
+    dest_host = _url_host(dest)
+    if dest_host and dest_host != expected_host:
+        # 別サイトのキャッシュなので無効化して“ミス扱い”
+        print(f"[mirror] cache host mismatch: dest_host={dest_host} expected={expected_host} -> reupload")
+        return None
+    return dest
+
+
 def _mirror_one(
     url: str,
     wp_client,
     prefix: str,
     cache_map: Dict[str, Dict[str, str]],
     to_write: List[Dict[str, str]],
-    expected_site_host: str,
 ) -> tuple[Optional[int], Optional[str]]:
+    """キャッシュに無い（または無効な）画像を1枚ダウンロード→WPへアップロードする。"""
     if not url:
         return None, None
 
-    print(f"[mirror:in] src={url}")
-
-    # CSVヒット：ただし「別サイトのdest_url」を掴んでる可能性があるので host を検証する
-    if url in cache_map:
-        dest = (cache_map[url].get('dest_url') or '').strip()
-        if dest:
-            dest_host = urlparse(dest).netloc.lower()
-            if expected_site_host and dest_host and dest_host != expected_site_host.lower():
-                # 別サイトのキャッシュなので無効化して“ミス扱い”
-                print(f"[mirror] cache host mismatch: dest_host={dest_host} expected={expected_site_host} -> reupload")
-            else:
-                mid = _resolve_media_id_from_url(wp_client, dest)
-                return mid, dest
-
     try:
-        b, ctype = _download(url)
-        h = hashlib.sha1(b).hexdigest()
-        path = urlparse(url).path
+        spool, ctype, h, nbytes = _download(url)
+        path = _url_path(url)
         ext = _guess_ext(ctype, path)
         fname = f"{prefix}-{h[:8]}{ext}"
 
-        media_id, dest = _wp_upload_from_url(url, fname, wp_client)
-
-        # ここで media_id が None でも、dest があれば REST 検索で補完
-        if dest and media_id is None:
-            media_id = _resolve_media_id_from_url(wp_client, dest)
+        with spool:
+            media_id, dest = _wp_upload_from_url(url, fname, wp_client, blob=(spool, ctype))
 
+        # media_id が None でも dest があれば、mirror_item_images 側で REST 検索して補完
         if dest:
-            row = {'src_url': url, 'dest_url': dest, 'sha1': h, 'bytes': str(len(b))}
-            cache_map[url] = row
-            to_write.append(row)
-            print(f"[mirror] OK {url} -> {dest} id={media_id} bytes={len(b)}")
+            row = {'src_url': url, 'dest_url': dest, 'sha1': h, 'bytes': str(nbytes)}
+            with _MAP_LOCK:
+                cache_map[url] = row
+                to_write.append(row)
+            print(f"[mirror] OK {url} -> {dest} id={media_id} bytes={nbytes}")
             return media_id, dest
 
         return None, None
@@ -310,50 +689,112 @@ def _mirror_one(
         return None, None
 
 
-def mirror_item_images(item: dict, wp_client, prefix: str) -> dict:
+# dest_url -> attachment ID（プロセス内で解決済みのもの。検索して無かった URL は None。通信エラーは入れない）
+_MEDIA_IDS: Dict[str, Optional[int]] = {}
+
+
+def site_map_for(wp_client) -> Tuple[str, Dict[str, Dict[str, str]]]:
+    """wp_client の投稿先サイトに対応する (マップCSVのパス, マップ) を返す。"""
+    map_path = _map_path_for_site(_site_key_from_wp(wp_client))
+    return map_path, get_cache(map_path)
+
+
+def mirror_item_images(
+    item: dict,
+    wp_client,
+    prefix: str,
+    site_map: Optional[Tuple[str, Dict[str, Dict[str, str]]]] = None,
+    map_writer: Optional[MirrorMapWriter] = None,
+) -> dict:
+    """
+    site_map: site_map_for(wp_client) の結果。run 単位で1回求めて渡せば作品ごとの解決を省ける。
+    map_writer: 同じマップCSVへの MirrorMapWriter。渡せば作品ごとに CSV を開き直さない。
+    """
     # ★ サイト別CSVに切り替え
-    site_key = _site_key_from_wp(wp_client)
-    map_path = _map_path_for_site(site_key)
-    expected_host = urlparse(_get_wp_base_url(wp_client)).netloc
+    map_path, cache = site_map or site_map_for(wp_client)
+    expected_host = _url_host(_get_wp_base_url(wp_client))
+    host_prefixes = (f"https://{expected_host}/", f"http://{expected_host}/")
 
-    cache = _load_map(map_path)
     pending: List[Dict[str, str]] = []
 
+    # --- 対象URLを (url, prefix) で列挙：ポスター → サンプル ---
+    # normalize 済みなら image_large / trailer_poster は str、sample_images は 'a|b|c'
+    # それ以外の型が来た時だけ _coerce_url で防御的に URL を取り出す
+    poster_url = item.get('image_large') or item.get('trailer_poster')
+    if poster_url and not isinstance(poster_url, str):
+        poster_url = _coerce_url(item.get('image_large')) or _coerce_url(item.get('trailer_poster'))
+    samples = _split_samples(item.get('sample_images'))
+
+    jobs: List[Tuple[str, str]] = []
+    if poster_url:
+        jobs.append((poster_url, f"{prefix}-poster"))
+    jobs += [(u, f"{prefix}-s{i:02d}") for i, u in enumerate(samples, 1)]
+
+    # 同一URLは1回だけミラー（ポスターとサンプルが同じ画像のケース）
+    results: Dict[str, tuple[Optional[int], Optional[str]]] = {}
+    if jobs:
+        uniq: Dict[str, str] = {}
+        for u, pf in jobs:
+            uniq.setdefault(u, pf)
+        misses: Dict[str, str] = {}
+        for u, pf in uniq.items():
+            print(f"[mirror:in] src={u}")
+            dest = _cached_dest(u, cache, expected_host, host_prefixes)
+            if dest:
+                # media_id は後でまとめて解決する
+                results[u] = (None, dest)
+            else:
+                misses[u] = pf
+        # キャッシュに無い分だけスレッドプールでダウンロード→アップロード
+        if misses:
+            ex = _get_pool()
+            futs = {
+                u: ex.submit(_mirror_one, u, wp_client, pf, cache, pending)
+                for u, pf in misses.items()
+            }
+            results.update((u, f.result()) for u, f in futs.items())
+
+    # アップロードで ID が取れた分は覚えておく（次の作品で同じ dest_url を引かない）
+    for mid, dest in results.values():
+        if dest and mid is not None:
+            _MEDIA_IDS[dest] = mid
+
+    # media_id が取れなかった分は、既知の ID → まとめて REST の順で解決（画像ごとに検索しない）
+    unresolved = [dest for mid, dest in results.values()
+                  if dest and mid is None and dest not in _MEDIA_IDS]
+    if unresolved:
+        # 検索して無かった分（None）も覚えて、同じ run で検索し直さない（通信エラー分は覚えない）
+        _MEDIA_IDS.update(_resolve_media_ids_bulk(wp_client, unresolved))
+    results = {
+        u: (mid if mid is not None else _MEDIA_IDS.get(dest), dest)
+        for u, (mid, dest) in results.items()
+    }
+
     # --- ポスター（アイキャッチ候補） ---
-    poster_url = _coerce_url(item.get('image_large')) or _coerce_url(item.get('trailer_poster'))
     if poster_url:
-        mid, new_poster = _mirror_one(
-            poster_url, wp_client, f"{prefix}-poster", cache, pending, expected_host
-        )
+        mid, new_poster = results.get(poster_url, (None, None))
         if new_poster:
             item['trailer_poster'] = new_poster
             item['image_large']    = new_poster
-        if (mid is None) and new_poster:
-            mid = _resolve_media_id_from_url(wp_client, new_poster)
         if mid:
             item['trailer_poster_id'] = int(mid)
             item['image_large_id']    = int(mid)
 
-    # --- サンプル画像 ---
-    samples_raw = _split_samples(item.get('sample_images'))
-    samples = [_coerce_url(s) for s in samples_raw]
+    # --- サンプル画像（入力順を維持） ---
     out: List[str] = []
     sample_ids: List[int] = []
-    idx = 1
     for u in samples:
-        if not u:
-            continue
-        smid, nu = _mirror_one(
-            u, wp_client, f"{prefix}-s{idx:02d}", cache, pending, expected_host
-        )
+        smid, nu = results.get(u, (None, None))
         out.append(nu or u)
         if smid:
             sample_ids.append(int(smid))
-        idx += 1
 
     item['sample_images'] = '|'.join(out)
     if sample_ids:
         item['sample_image_ids'] = sample_ids
 
-    _append_map(map_path, pending)
+    if map_writer is not None:
+        map_writer.write_rows(pending)
+    else:
+        _append_map(map_path, pending)
     return item
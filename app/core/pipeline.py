@@ -1,9 +1,13 @@
 # app/core/pipeline.py
-import time, csv
+import time, csv, json, tempfile
 import re
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import ExitStack
+from datetime import datetime
+from functools import lru_cache, partial
 from typing import Dict, Any, List
 from app.providers.fanza import fetch_items, normalize_item, build_content_html, \
-    _is_now_printing_url_like, _probe_is_placeholder, _pick_best_feature, sanitize_trailer_fields, get_player_size_from_env
+    _is_now_printing_url_like, _probe_placeholder_status, _fast_placeholder_heuristic, _pick_best_feature, sanitize_trailer_fields, get_player_size_from_env
 from app.core.wp_rest import WPClient
 from app.core.filters import apply_filters
 from app.util.logger import log_json
@@ -11,19 +15,25 @@ from importlib import import_module
 from app.core.content_builder import ContentBuilder
 import os as _os
 from app.core.seo import build_seo_fields, build_wp_seo_meta
-from app.core.csv_dedupe import load_skip_cids, append_ledger, load_skip_cids_in_dir
-from app.core.image_mirror import mirror_item_images
+from app.core.csv_dedupe import load_skip_cids, LedgerWriter, load_skip_cids_in_dir
+from app.core.image_mirror import MirrorMapWriter, mirror_item_images, site_map_for
 from pathlib import Path
 import traceback
 from app.providers import fanza_book
 
 from urllib.parse import urlparse
 import os, mimetypes, requests, io
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
 
-TAG_STOPWORDS = set(["ハイビジョン", "サンプル", "動画", "独占配信"])
+TAG_STOPWORDS = frozenset({"ハイビジョン", "サンプル", "動画", "独占配信"})
+
+# 埋め込み iframe の size=WIDTH_HEIGHT（1280_720 以外のサイズで来ても差し替える）
+_EMBED_SIZE_RE = re.compile(r"\bsize=\d+_\d+")
 
 _ZW_RE = re.compile(r"[\u200B\u200C\u200D\uFEFF]")  # ゼロ幅類
 
+@lru_cache(maxsize=8192)  # 同じジャンル/女優名が作品を跨いで何度も来る
 def _norm(s: str | None) -> str:
     if not s:
         return ""
@@ -32,8 +42,11 @@ def _norm(s: str | None) -> str:
     return s.strip()
 
 # 追加: 正規化済み stopwords
-TAG_STOPWORDS_N = {_norm(x) for x in TAG_STOPWORDS}
+TAG_STOPWORDS_N = frozenset(_norm(x) for x in TAG_STOPWORDS)
+# 部分一致判定を1本の正規表現に（語ごとの Python ループを回さない）
+_STOP_RE = re.compile("|".join(map(re.escape, sorted(TAG_STOPWORDS_N))))
 
+@lru_cache(maxsize=4096)
 def _is_stopword_term(term: str) -> bool:
     """完全一致 or 部分一致でノイズ語を弾く"""
     t = _norm(term)
@@ -42,7 +55,7 @@ def _is_stopword_term(term: str) -> bool:
     if t in TAG_STOPWORDS_N:
         return True
     # '独占配信中', 'ハイビジョン対応' などの派生も除外
-    return any(sw in t for sw in TAG_STOPWORDS_N)
+    return _STOP_RE.search(t) is not None
 
 # ---- 追加: args からテンプレパスを確実に拾うユーティリティ
 def _get_content_template_path(args) -> str | None:
@@ -64,79 +77,126 @@ def get_wp_client_from_env():
     return WPClient(base, user, ap)
 
 # --- 女優・ジャンル等を分割する小関数とタグのストップワード ---
+_SPLIT_RE = re.compile(r"[、,\s/・\|｜]+")  # ← 全角｜(U+FF5C) を追加
+
 def _split_terms(s: str | None) -> list[str]:
     """
     空白/カンマ/読点/中黒/スラッシュ/パイプ(半角/全角) で分割して正規化。
     """
-    parts = re.split(r"[、,\s/・\|｜]+", (s or ""))  # ← 全角｜(U+FF5C) を追加
-    out = []
-    for x in parts:
-        n = _norm(x)
-        if n:
-            out.append(n)
-    return out
+    return [n for n in map(_norm, _SPLIT_RE.split(s or "")) if n]
+
+@lru_cache(maxsize=8)
+def _parse_threshold(ymd: str) -> datetime | None:
+    """--release-after の値は run 中不変なので1回だけパース（不正なら None）"""
+    try:
+        return datetime.fromisoformat(ymd)
+    except ValueError:
+        return None
 
 def _is_newer_than(date_str: str, ymd: str | None) -> bool:
-    from datetime import datetime
     if not date_str or not ymd:
         return False
+    thr = _parse_threshold(ymd)
+    if thr is None:
+        return False
+    d = date_str.split(" ")[0]
+    # 両方 YYYY-MM-DD なら文字列比較で足りる（ISO 8601 の日付は辞書順＝日付順）
+    if len(d) == 10 and len(ymd) == 10 and d[4] == d[7] == "-":
+        return d > ymd
     try:
-        d_item = datetime.fromisoformat(date_str.split(" ")[0])
-        d_thr  = datetime.fromisoformat(ymd)
-        return d_item > d_thr
-    except Exception:
+        return datetime.fromisoformat(d) > thr
+    except ValueError:
         return False
 
-def _filter_and_enhance(row: Dict[str, Any], args) -> Dict[str, Any] | None:
+# ページ内の HEAD 確認の並列数（I/O 待ちが支配的）
+PROBE_WORKERS = max(1, int(os.getenv("HEAD_PROBE_WORKERS", "8") or 8))
+# ページ内の WP 投稿の並列数（WP 側の負荷を考えて控えめに）
+WP_WORKERS = max(1, int(os.getenv("WP_POST_WORKERS", "4") or 4))
 
-    # HEAD制御パラメータ
-    use_head    = not getattr(args, "no_head_check", False)
-    head_timeout = float(getattr(args, "head_timeout", 3.0))
-    head_verify  = not getattr(args, "head_insecure", False)
 
+def _probe_cached(u: str, timeout: float, verify: bool, use_network: bool,
+                  memo: Dict[str, bool] | None = None) -> bool:
+    """
+    _probe_is_placeholder の URL 単位メモ化（同じ画像へ HEAD を繰り返さない）。
+    memo は run ごとの dict。通信エラー/5xx 等の確定でない結果は入れない（次に見た時に HEAD し直す）。
+    """
+    if memo is not None and u in memo:
+        return memo[u]
+    res, definite = _probe_placeholder_status(u, timeout=timeout, verify=verify, use_network=use_network)
+    if memo is not None and definite:
+        memo[u] = res
+    return res
+
+
+def _is_placeholder(u: str, head_timeout: float, head_verify: bool, use_head: bool,
+                    memo: Dict[str, bool] | None = None) -> bool:
+    return (not u) or _is_now_printing_url_like(u) or \
+           _probe_cached(u, head_timeout, head_verify, use_head, memo)
+
+
+def _cheap_filter(
+    row: Dict[str, Any], *,
+    min_samples: int = 0,
+    release_after: str | None = None,
+) -> bool:
+    """ネットワークを使わずに判定できる足切り（サンプル枚数・発売日）。残すなら True。"""
+    samples = row.get("sample_images") or ""
+    if min_samples and sum(1 for s in samples.split("|") if s) < min_samples:
+        return False
+    if _is_newer_than(row["date"], release_after):
+        return False
+    return True
+
+
+def _expand_row(
+    row: Dict[str, Any], *,
+    verify_images: bool = False,
+    skip_placeholder: bool = False,
+    use_head: bool = True,
+    head_timeout: float = 3.0,
+    head_verify: bool = True,
+    probe_memo: Dict[str, bool] | None = None,
+) -> Dict[str, Any] | None:
+    """
+    画像検証（HEAD あり）とジャケット差し替え。プレースホルダで足切りなら None。
+    コストが高いので _cheap_filter / apply_filters を通った行にだけ使う。
+    """
     # 画像検証&代替
-    if args.verify_images:
-        ph = False
-        if not row["image_large"]:
-            ph = True
-        elif _is_now_printing_url_like(row["image_large"]):
-            ph = True
-        else:
-            ph = _probe_is_placeholder(
-                row["image_large"],
-                timeout=head_timeout,
-                verify=head_verify,
-                use_network=use_head
-            )
-        if ph:
+    if verify_images:
+        if _is_placeholder(row["image_large"], head_timeout, head_verify, use_head, probe_memo):
             samples = [s for s in row["sample_images"].split("|") if s]
             if samples:
                 cand = _pick_best_feature(samples)
                 # サンプル側はURLヒューリスティック優先（必要ならここでHEADしてもOK）
-                from app.providers.fanza import _fast_placeholder_heuristic
                 if cand and not _fast_placeholder_heuristic(cand):
                     row["image_large"] = cand
 
-    # 足切り
-    samples_cnt = len([s for s in row["sample_images"].split("|") if s])
-
-    if args.skip_placeholder:
-        ph2 = (not row["image_large"]) or _is_now_printing_url_like(row["image_large"]) or \
-              _probe_is_placeholder(
-                  row["image_large"],
-                  timeout=head_timeout,
-                  verify=head_verify,
-                  use_network=use_head
-              )
-        if ph2:
-            return None
-
-    if samples_cnt < args.min_samples:
-        return None
-    if _is_newer_than(row["date"], args.release_after):
+    # verify_images で判定済みの URL はキャッシュから返る（2回目の HEAD は飛ばない）
+    if skip_placeholder and _is_placeholder(row["image_large"], head_timeout, head_verify, use_head, probe_memo):
         return None
     return row
 
+
+def _filter_options(args, probe_memo: Dict[str, bool] | None = None) -> tuple[Dict[str, Any], Dict[str, Any]]:
+    """
+    _cheap_filter / _expand_row に渡す設定を args から1回だけ取り出す。
+    probe_memo: HEAD 判定のメモ（run ごとに新しい dict を渡す）
+    """
+    cheap = dict(
+        min_samples=args.min_samples,
+        release_after=args.release_after,
+    )
+    expand = dict(
+        verify_images=bool(args.verify_images),
+        skip_placeholder=bool(args.skip_placeholder),
+        # HEAD制御パラメータ
+        use_head=not getattr(args, "no_head_check", False),
+        head_timeout=float(getattr(args, "head_timeout", 3.0)),
+        head_verify=not getattr(args, "head_insecure", False),
+        probe_memo=probe_memo,
+    )
+    return cheap, expand
+
 def _init_wp(args) -> tuple[WPClient | None, list[int], list[int], str]:
     wp = None
     cat_ids, tag_ids = [], []
@@ -185,14 +245,38 @@ def _init_content_builder(args) -> ContentBuilder | None:
         hook=hook_fn,
     )
 
+@lru_cache(maxsize=1)
+def _get_session() -> requests.Session:
+    """メディア検索・アイキャッチ取得用の共有セッション（同一ホストへの TCP/TLS 接続を使い回す）"""
+    s = requests.Session()
+    adapter = HTTPAdapter(
+        pool_connections=4,
+        pool_maxsize=32,   # WP_POST_WORKERS 並列でもプールが溢れない大きさ
+        max_retries=Retry(total=3, backoff_factor=0.3, status_forcelist=(429, 500, 502, 503, 504),
+                          allowed_methods=frozenset({"GET", "HEAD"})),
+    )
+    s.mount("https://", adapter)
+    s.mount("http://", adapter)
+    return s
+
+
+@lru_cache(maxsize=1)
+def _wp_env_creds() -> tuple[str, str, str]:
+    """WP_URL / WP_USER / WP_APP_PASS（.env 読み込み後の初回呼び出しで確定し、以降は使い回す）"""
+    return os.getenv("WP_URL", "").rstrip("/"), os.getenv("WP_USER", ""), os.getenv("WP_APP_PASS", "")
+
+
+# 呼び出し側が見るのは id / source_url だけ（media_details の全サイズ等を転送・デコードしない）
+_MEDIA_HIT_FIELDS = "id,source_url"
+
+
 # 置き換え: _search_media_by_filename を拡張
-def _search_media_by_filename(wp, filename, per_page=5):
+def _search_media_by_filename(wp, filename, per_page=5, session=None):
     try:
         return wp.search_media_by_filename(filename, per_page=per_page)
     except AttributeError:
-        base = os.getenv("WP_URL", "").rstrip("/")
-        user = os.getenv("WP_USER", "")
-        app  = os.getenv("WP_APP_PASS", "")
+        session = session or _get_session()
+        base, user, app = _wp_env_creds()
         if not (base and user and app):
             return []
 
@@ -200,8 +284,8 @@ def _search_media_by_filename(wp, filename, per_page=5):
         name_noext = os.path.splitext(filename)[0]
         try:
             url = f"{base}/wp-json/wp/v2/media"
-            r = requests.get(url, params={"slug": name_noext, "per_page": 1},
-                             auth=(user, app), timeout=15)
+            r = session.get(url, params={"slug": name_noext, "per_page": 1, "_fields": _MEDIA_HIT_FIELDS},
+                            auth=(user, app), timeout=15)
             r.raise_for_status()
             d = r.json() or []
             if d:  # 見つかればそれを返す
@@ -212,43 +296,46 @@ def _search_media_by_filename(wp, filename, per_page=5):
         # 2) それでも無ければ通常の search で候補を返す
         try:
             url = f"{base}/wp-json/wp/v2/media"
-            r = requests.get(url, params={"search": filename, "per_page": per_page},
-                             auth=(user, app), timeout=20)
+            r = session.get(url, params={"search": filename, "per_page": per_page, "_fields": _MEDIA_HIT_FIELDS},
+                            auth=(user, app), timeout=20)
             r.raise_for_status()
             return r.json() or []
         except Exception:
             return []
 
 
-def _ensure_featured_media_mirrored(wp, url: str) -> int | None:
+def _ensure_featured_media_mirrored(wp, url: str, session=None) -> int | None:
     parsed = urlparse(url)
     fname  = os.path.basename(parsed.path)
 
-    hits = _search_media_by_filename(wp, fname, per_page=15) or []
+    hits = _search_media_by_filename(wp, fname, per_page=15, session=session) or []
     if not hits:
         return None
 
+    # 比較対象は小文字化して1回だけ作る（hits ごとに urlparse しない）
+    url_lc, fname_lc = url.rstrip("/").lower(), fname.lower()
+    hits_lc = [(m, str(m.get("source_url") or "").lower()) for m in hits]
+
     # 1) source_url 完全一致
-    for m in hits:
-        su = str(m.get("source_url") or "")
-        if su.rstrip("/").lower() == url.rstrip("/").lower():
+    for m, su in hits_lc:
+        if su.rstrip("/") == url_lc:
             return m.get("id")
 
-    # 2) basename の厳密一致（末尾一致ではなく“同名”のみ）
-    for m in hits:
-        su = str(m.get("source_url") or "")
-        if os.path.basename(urlparse(su).path).lower() == fname.lower():
+    # 2) basename の厳密一致（末尾一致ではなく“同名”のみ。クエリ/フラグメントは除く）
+    for m, su in hits_lc:
+        if su.partition("?")[0].partition("#")[0].rsplit("/", 1)[-1] == fname_lc:
             return m.get("id")
 
     # 3) どれにも一致しないなら “見つからず” 扱い（誤命中を防ぐ）
     return None
 
 
-def _ensure_featured_media_external(wp, url: str, row: dict) -> int | None:
+def _ensure_featured_media_external(wp, url: str, row: dict, session=None) -> int | None:
     """
     外部URLをダウンロードして /media へアップロード（MIME/拡張子を尊重）。
     既に同名があれば流用。
     """
+    session = session or _get_session()
     parsed = urlparse(url)
     base_name = os.path.basename(parsed.path) or f"{row.get('cid','post')}"
     name_noext, ext = os.path.splitext(base_name)
@@ -257,42 +344,111 @@ def _ensure_featured_media_external(wp, url: str, row: dict) -> int | None:
 
     # 同名が既にあれば流用
     fname_try = f"{row.get('cid','post')}{ext.lower()}"
-    hits = _search_media_by_filename(wp, fname_try, per_page=1) or []
+    hits = _search_media_by_filename(wp, fname_try, per_page=1, session=session) or []
     if hits:
         return hits[0]["id"]
 
-    # ダウンロード
-    resp = requests.get(url, timeout=30)
-    resp.raise_for_status()
-    data = resp.content
-
-    # MIME 推定（レスポンス優先→拡張子）
-    mime = resp.headers.get("Content-Type", "").split(";")[0].strip() or None
-    if not mime:
-        mime, _ = mimetypes.guess_type(base_name)
-    if not mime:
-        mime = "image/jpeg"
-
-    # 拡張子を MIME に合わせて調整
-    ext_map = {"image/jpeg": ".jpg", "image/png": ".png", "image/webp": ".webp"}
-    want_ext = ext_map.get(mime, ext.lower())
-    if not fname_try.lower().endswith(want_ext):
-        fname_try = f"{row.get('cid','post')}{want_ext}"
-
-    # 最終チェック：同名が増えていないか
-    hits = _search_media_by_filename(wp, fname_try, per_page=1) or []
-    if hits:
-        return hits[0]["id"]
+    # ダウンロード（本文はまだ読まない。同名ヒットなら転送せずに済む）
+    with session.get(url, timeout=30, stream=True) as resp:
+        resp.raise_for_status()
+
+        # MIME 推定（レスポンス優先→拡張子）
+        mime = resp.headers.get("Content-Type", "").split(";")[0].strip() or None
+        if not mime:
+            mime, _ = mimetypes.guess_type(base_name)
+        if not mime:
+            mime = "image/jpeg"
+
+        # 拡張子を MIME に合わせて調整
+        ext_map = {"image/jpeg": ".jpg", "image/png": ".png", "image/webp": ".webp"}
+        want_ext = ext_map.get(mime, ext.lower())
+        if not fname_try.lower().endswith(want_ext):
+            fname_try = f"{row.get('cid','post')}{want_ext}"
+
+        # 最終チェック：同名が増えていないか
+        hits = _search_media_by_filename(wp, fname_try, per_page=1, session=session) or []
+        if hits:
+            return hits[0]["id"]
+
+        # 画像はメモリに丸ごと載せず、一時ファイルへストリーム
+        spool = tempfile.SpooledTemporaryFile(max_size=2_000_000)
+        for chunk in resp.iter_content(64 * 1024):
+            spool.write(chunk)
+
+    # アップロード（取得済みの本体をそのまま送る。URL から取り直さない）
+    with spool:
+        spool.seek(0)
+        if hasattr(wp, "upload_media"):
+            return wp.upload_media({"file": (fname_try, spool, mime)})["id"]
+        data = spool.read()
+        try:
+            if hasattr(wp, "upload_media_bytes"):
+                return wp.upload_media_bytes(data, filename=fname_try, mime=mime)
+            # フォールバック：upload_media_from_bytes 的なものが無ければ URL 名を使って通常アップロードAPIを呼ぶ
+            return wp.upload_media_from_bytes(data, filename=fname_try, mime=mime)  # ある場合
+        except AttributeError:
+            # 既存の URL アップローダしか無い場合でも、MIME/拡張子を整えた filename を渡す
+            return wp.upload_media_from_url(url, fname_try)
+
+# --outfile の既定カラム順（これ以外のキーは後ろに初出順で並べる）
+OUTFILE_BASE_FIELDS = [
+    "cid", "title", "URL", "date",
+    "maker", "actress", "genres",
+    "sample_images", "image_large",
+    "trailer_url",        # mp4 直リンク（あれば）
+    "trailer_youtube",    # YouTube ID/URL（あれば）
+    "trailer_poster",     # ポスター画像（あれば）
+    "trailer_embed",      # 生iframe等（通常は空）
+    "content",
+    "aspect_ratio",
+]
+_OUTFILE_BASE_SET = frozenset(OUTFILE_BASE_FIELDS)
+
+
+class _RowSpool:
+    """
+    --outfile 用の行を一時ファイルへ1行ずつ逃がし、最後に CSV へ書き出す。
+    全件の content(HTML) をメモリに抱えないため。
+    ヘッダは全行のキーの和集合なので、CSV 化は最後に1回だけ行う。
+    """
+    def __init__(self):
+        self.count = 0
+        self._keys: Dict[Any, int] = {}  # 列キー -> 番号（初出順）
+        self._tmp = None
+
+    def add(self, row: Dict[str, Any]):
+        if self._tmp is None:
+            self._tmp = tempfile.TemporaryFile("w+", encoding="utf-8")
+        # 値は csv モジュールと同じく str() 済みで逃がす（JSON の型変換で CSV の中身が変わらないように）
+        cells = []
+        for k, v in row.items():
+            i = self._keys.get(k)
+            if i is None:
+                i = self._keys[k] = len(self._keys)
+            cells.append((i, "" if v is None else str(v)))
+        self._tmp.write(json.dumps(cells, ensure_ascii=False))
+        self._tmp.write("\n")
+        self.count += 1
+
+    def write_csv(self, path: str):
+        fieldnames = [c for c in OUTFILE_BASE_FIELDS if c in self._keys] + \
+                     [c for c in self._keys if c not in _OUTFILE_BASE_SET]  # ← player_width 等も書ける
+        cols = [self._keys[c] for c in fieldnames]
+        # DictWriter の行ごとのキー検索を避け、値の並びを先に作って C 実装の writer に渡す
+        with open(path, "w", newline="", encoding="utf-8-sig", buffering=1024 * 1024) as f:
+            w = csv.writer(f)
+            w.writerow(fieldnames)
+            if self._tmp is not None:
+                self._tmp.seek(0)
+                for line in self._tmp:
+                    r = dict(json.loads(line))
+                    w.writerow([r.get(i, "") for i in cols])
+
+    def close(self):
+        if self._tmp is not None:
+            self._tmp.close()
+            self._tmp = None
 
-    # アップロード
-    try:
-        if hasattr(wp, "upload_media_bytes"):
-            return wp.upload_media_bytes(data, filename=fname_try, mime=mime)
-        # フォールバック：upload_media_from_bytes 的なものが無ければ URL 名を使って通常アップロードAPIを呼ぶ
-        return wp.upload_media_from_bytes(data, filename=fname_try, mime=mime)  # ある場合
-    except AttributeError:
-        # 既存の URL アップローダしか無い場合でも、MIME/拡張子を整えた filename を渡す
-        return wp.upload_media_from_url(url, fname_try)
 
 def run_pipeline(args) -> Dict[str, Any]:
     # ====== どのProviderを使うかを決定 ======
@@ -332,341 +488,450 @@ def run_pipeline(args) -> Dict[str, Any]:
     if content_template_path:
         content_template_path = str(Path(content_template_path))
 
-    out_rows: List[Dict[str, Any]] = []
-    offset, got = 1, 0
-    # 新規件数の目標/カウンタ
-    target_new: int = int(getattr(args, "target_new", 0) or 0)
-    new_count: int = 0
-    # 既存を更新しない運用
-    no_update_existing: bool = bool(getattr(args, "no_update_existing", False))
-    debug_dumped = False
-
-    ledger_path = getattr(args, "ledger", None)
-
-    # 起動時にスキップCID集合を準備
-    skip_cids = set()
-    # A) 互換: 既存の --skip-from-csv / --skip-csv-col が来ていたら尊重
-    _from_csv = getattr(args, "skip_from_csv", None)
-    if _from_csv:
-        skip_cids |= load_skip_cids(_from_csv, colname=getattr(args, "skip_csv_col", "cid"))
-    # B) 新規: --auto-skip-outputs が有効なら、outfile のフォルダ（無ければ ./out）を総なめ
-    if getattr(args, "auto_skip_outputs", False):
-        import os
-        base_dir = None
-        if getattr(args, "outfile", None):
-            base_dir = os.path.dirname(args.outfile) or "."
-        if not base_dir:
-            base_dir = "out"
-        skip_cids |= load_skip_cids_in_dir(base_dir, "*.csv")
-
-    # ====== 取得ループ ======
-    while got < args.max and (target_new == 0 or new_count < target_new):
-        data = _fetch(args.api_id, args.affiliate_id, params, start=offset, hits=args.hits)
-        result = data.get("result") or {}
-        items = result.get("items") or []
-        if not items:
-            break
-
-        # 最初の要素をダンプ（デバッグ用）
-        if getattr(args, "debug", False) and not debug_dumped and items:
-            import json
-            with open("raw_first_item.json", "w", encoding="utf-8") as f:
-                json.dump(items[0], f, ensure_ascii=False, indent=2)
-            debug_dumped = True
-
-        for it in items:
-            # -- 標準化 → 事前フィルタ・補強 --
-            row = _normalize(it)
-
-            # === 画像ミラー（本文生成の直前に実施：直前で上書きされるのを防ぐ） ===
-            if getattr(args, 'mirror_images', False):
-                try:
-                    wp2 = wp if ('wp' in locals() and wp) else get_wp_client_from_env()
-                except Exception as e:
-                    print(f"[mirror] WP client init skipped: {e}")
-                    wp2 = None
-                if wp2:
-                    cid_for_name = (row.get('cid') or row.get('external_id') or f"post{int(time.time())}").lower()
-                    try:
-                        row = mirror_item_images(row, wp2, cid_for_name)
-                        # 置換できたかをログで確認（先頭だけ）
-                        print(f"[mirror] sample_images[:1] = { (row.get('sample_images') or '').split('|')[:1] }")
-                        print(f"[mirror] image_large = { row.get('image_large') }")
-                    except Exception as e:
-                        print(f"[mirror] skip {cid_for_name}: {e}")
-
-            # --- （動画のみ）プレイヤーサイズ注入 & iframeサイズ補正 ---
-            if not is_books:
-                W, H, ratio = get_player_size_from_env()
-                row["player_width"] = W
-                row["player_height"] = H
-                row["aspect_ratio"] = ratio  # 例: 56.25
-                if row.get("trailer_embed"):
-                    row["trailer_embed"] = row["trailer_embed"].replace("size=1280_720", f"size={W}_{H}")
-
-            # --- CSVベース重複スキップ（記事単位） ---
-            cid = (row.get("cid") or "").strip()
-            if cid and cid in skip_cids:
-                continue
-
-            # （動画のみ）トレーラーフィールドのサニタイズ
-            if not is_books:
-                row = sanitize_trailer_fields(row)
-
-            row = _filter_and_enhance(row, args)
-            if not row:
-                continue
-            
-            # --- 表示用フィールド（テンプレで使う） ---
-            row["genres_clean"]  = ",".join([g for g in _split_terms(row.get("genres")) if not _is_stopword_term(g)])
-            row["maker_clean"]   = _norm(row.get("maker"))
-            row["actress_clean"] = ",".join(_split_terms(row.get("actress")))
-
-            # -- 後段フィルタ（キーワード・除外語など） --
-            filtered = apply_filters([row], args)
-            if not filtered:
-                continue
-            row = filtered[0]
-
-            # -- 本文生成（テンプレ優先。未指定/欠落時は従来HTML）--
-            if content_template_path:
-                p = Path(content_template_path)
-                if not p.exists():
-                    log_json("error", where="content_build",
-                             error=f"template_not_found: {p}", cid=row.get("cid"))
-                    # テンプレが物理的に無い時だけ従来HTMLへ落とす
-                    row["content"] = "<!-- tpl:missing -->" + \
-                                     _build(row, content_builder=None, max_gallery=max_gallery)
-                else:
-                    # ① post.html.j2 を直接描画
-                    try:
-                        # ContentBuilderはrender_fileを持たない実装なので、
-                        # build_content_htmlにContentBuilder(template_path=...)を渡して描画する
-                        cb = ContentBuilder(template_path=str(p))
-                        html = _build(row, content_builder=cb, max_gallery=max_gallery)
-                        row["content"] = "<!-- tpl:post -->" + html
-                    except Exception as e1:
-                        # ここで落ちたら“原因を隠さない”ために安易に content.html.j2 へは落とさない
-                        log_json("error", where="content_build",
-                                 error=f"post_tpl_render_failed: {e1}", cid=row.get("cid"))
-                        # 最低限の保険だけ（従来HTML）。コメントで判別できるようにする
-                        try:
-                            fallback = _build(row, content_builder=None, max_gallery=max_gallery)
-                            row["content"] = "<!-- tpl:content(fallback) -->" + fallback
-                        except Exception as e2:
-                            log_json("error", where="content_build",
-                                     error=f"legacy_build_failed: {e2}", cid=row.get("cid"))
-                            row["content"] = ""
+    # テンプレの存在確認と ContentBuilder の生成は作品ごとでなく run 中1回だけ
+    tpl_path, tpl_exists, tpl_cb, tpl_cb_error = None, False, None, None
+    if content_template_path:
+        tpl_path = Path(content_template_path)
+        tpl_exists = tpl_path.exists()
+        if tpl_exists:
+            try:
+                tpl_cb = ContentBuilder(template_path=str(tpl_path))
+            except Exception as e:
+                tpl_cb_error = e
+
+    # run 中に開くファイル/スレッドは例外・中断でも必ず閉じる（台帳・マップの書き残しを出さない）
+    with ExitStack() as stack:
+        # WPなし運用で採用した行（--outfile があれば一時ファイルへ逃がす）
+        kept_count: int = 0
+        out_spool = _RowSpool() if getattr(args, "outfile", None) else None
+        if out_spool:
+            stack.callback(out_spool.close)
+        # 本文(HTML)を使うのは WP 投稿と --outfile の content 列だけ（--no-content は CSV に本文を出さない）
+        build_content = bool(wp) or (out_spool is not None and not no_content)
+        offset, got = 1, 0
+        # 新規件数の目標/カウンタ
+        target_new: int = int(getattr(args, "target_new", 0) or 0)
+        new_count: int = 0
+        # 既存を更新しない運用
+        no_update_existing: bool = bool(getattr(args, "no_update_existing", False))
+        debug_dumped = False
+
+        ledger_path = getattr(args, "ledger", None)
+        # 台帳は1回だけ開いて使い回す（行ごとの open/close を避ける）
+        ledger = stack.enter_context(LedgerWriter(ledger_path)) if ledger_path else None
+
+        # 起動時にスキップCID集合を準備
+        skip_cids: set[str] = set()
+        # A) 互換: 既存の --skip-from-csv / --skip-csv-col が来ていたら尊重
+        #    （返ってきた集合をそのまま使い、空集合への丸ごとコピーを作らない）
+        _from_csv = getattr(args, "skip_from_csv", None)
+        if _from_csv:
+            skip_cids = load_skip_cids(_from_csv, colname=getattr(args, "skip_csv_col", "cid"))
+        # B) 新規: --auto-skip-outputs が有効なら、outfile のフォルダ（無ければ ./out）を総なめ
+        if getattr(args, "auto_skip_outputs", False):
+            base_dir = None
+            if getattr(args, "outfile", None):
+                base_dir = os.path.dirname(args.outfile) or "."
+            if not base_dir:
+                base_dir = "out"
+            if skip_cids:
+                skip_cids |= load_skip_cids_in_dir(base_dir, "*.csv")
             else:
-                # テンプレ未指定：従来HTML
-                row["content"] = "<!-- tpl:content(default) -->" + \
-                                 _build(row, content_builder=None, max_gallery=max_gallery)
-
-            # -- CSV運用（WPなし）の“新規”定義：skip_cids に無い → 新規として採用
-            #    out_rows に入れたら new_count を加算
-            if not wp:
-                out_rows.append(row)
-                if target_new:
-                    new_count += 1
-                if ledger_path:
-                    try:
-                        import datetime as _dt
-                        row_for_ledger = dict(row)
-                        row_for_ledger["exported_at"] = _dt.datetime.utcnow().isoformat()
-                        append_ledger(ledger_path, row_for_ledger)
-                    except Exception as _e:
-                        log_json("warn", where="append_ledger", error=str(_e), cid=row.get("cid"))
-                continue  # WPなしはここで次のアイテムへ
+                skip_cids = load_skip_cids_in_dir(base_dir, "*.csv")
+
+        # ====== 画像ミラーの準備（WPクライアントとサイト別マップは run 中1回だけ解決） ======
+        wp_mirror, mirror_map, mirror_writer = None, None, None
+        if getattr(args, 'mirror_images', False):
+            try:
+                wp_mirror = wp if wp else get_wp_client_from_env()
+                mirror_map = site_map_for(wp_mirror)
+                mirror_writer = stack.enter_context(MirrorMapWriter(mirror_map[0]))
+            except Exception as e:
+                print(f"[mirror] WP client init skipped: {e}")
+                wp_mirror = None
+
+        # 事前フィルタの設定は run 中不変なので1回だけ取り出して束縛しておく
+        # HEAD 判定のメモは run 単位（プロセスを跨いで一時的な失敗を持ち越さない）
+        cheap_opts, expand_opts = _filter_options(args, probe_memo={})
+        cheap_filter = partial(_cheap_filter, **cheap_opts)
+        expand_row = partial(_expand_row, **expand_opts)
+
+        def _pool(workers: int) -> ThreadPoolExecutor:
+            # run の終わり（例外・中断を含む）で止める。積まれたまま未着手の仕事は捨て、実行中の分は待つ
+            pool = ThreadPoolExecutor(max_workers=workers)
+            stack.callback(pool.shutdown, cancel_futures=True)
+            return pool
+
+        # HEAD 確認（--verify-images / --skip-placeholder）がある時だけ、ページ内の確認を並列化する
+        probes = (expand_opts["verify_images"] or expand_opts["skip_placeholder"]) and expand_opts["use_head"]
+        probe_pool = _pool(PROBE_WORKERS) if probes else None
+
+        # ループ内で参照する args もここで確定
+        debug = getattr(args, "debug", False)
+        mirror_images = getattr(args, "mirror_images", False)
+        future_datetime = getattr(args, "future_datetime", None)
+        svc   = (getattr(args, "service", "") or "").lower()
+        floor = (getattr(args, "floor", "") or "").lower()
+        # プレイヤーサイズ（env 由来で run 中不変）
+        W, H, ratio = get_player_size_from_env()
+        embed_size = f"size={W}_{H}"
+        site_name = _os.getenv("SITE_NAME") or ""
+        wp_tag_names = [n for n in (_norm(s) for s in (getattr(args, "wp_tags", "") or "").split(","))
+                        if n and not _is_stopword_term(n)]
+
+        # ---- 作品ごとのカテゴリ（女優）とタグ名を算出（ID 解決は WPClient 側でまとめて） ----
+        def _term_names(row: Dict[str, Any]) -> tuple[list[str], list[str]]:
+            actresses = [_norm(x) for x in _split_terms(row.get("actress"))]
+            # カテゴリは“女優名のカテゴリ”を1つだけ付ける（ナビ崩れ防止）
+            cat_names = actresses[:1]
+
+            # ジャンル（複数）からノイズ語を除外
+            genres = (g for g in _split_terms(row.get("genres")) if not _is_stopword_term(g))
+            # 単一値系
+            singles = (v for v in (_norm(row.get(key)) for key in ("maker", "label", "series"))
+                       if v and not _is_stopword_term(v))
+
+            # --wp-tags → 女優（タグとしても付与：テーマ側の横断検索に有利）→ ジャンル → 単一値系
+            # 重複除去（順序維持）＋上限
+            merged_tag_names = list(dict.fromkeys(
+                t for t in (*wp_tag_names, *actresses, *genres, *singles) if t
+            ))
+            return cat_names, merged_tag_names[:15]
+
+        # ---- WP 投稿の準備（1作品分）。ページ内の作品を並列に準備するため関数に切り出す ----
+        def _prepare_post(row: Dict[str, Any]) -> tuple[Dict[str, Any], int | None] | None:
+            """
+            投稿1件分の準備（アイキャッチ・ターム解決・タイトル整形）をして
+            (create_or_update_post の引数, 既存pid) を返す。既存を更新しない運用でスキップした時は None。
+            """
+            cid = (row.get("cid") or "").strip()
 
-            # -- 直投稿（任意） --
-            if wp:
-                # 事前に“既存かどうか”を判定（更新しない運用/新規カウントに使う）
+            # 事前に“既存かどうか”を判定（更新しない運用/新規カウントに使う）
+            existing_pid = None
+            try:
+                existing_pid = wp.find_post_id_by_external(cid) if cid else None
+            except Exception:
                 existing_pid = None
+
+            # 既存を更新しないフラグが立っていて、既存ヒット → スキップ
+            if no_update_existing and existing_pid:
+                return None
+
+            # --- SEOメタ生成 ---
+            seo = build_seo_fields(row, site_name=site_name)
+            meta_extra = {"provider": "FANZA", **build_wp_seo_meta(seo)}
+
+            # ★ アイキャッチ（ジャケット）— ID最優先で確実に
+            feat_id = row.get("image_large_id") or row.get("trailer_poster_id")
+            if not feat_id:
+                def _pick_feat_url(r):
+                    # image_large → trailer_poster → samples[0]
+                    return r.get("image_large") or r.get("trailer_poster") \
+                           or ( r["sample_images"].partition("|")[0] if r.get("sample_images") else None )
+                feat_url = _pick_feat_url(row)
+                if feat_url:
+                    try:
+                        if mirror_images:
+                            # ミラー運用：uploads 内から ID を逆引き（再アップしない）
+                            feat_id = _ensure_featured_media_mirrored(wp, feat_url)
+                        else:
+                            # 非ミラー運用：外部から取得してアップロード
+                            feat_id = _ensure_featured_media_external(wp, feat_url, row)
+                    except Exception as e:
+                        log_json("warn", where="featured_media", error=str(e), url=feat_url, cid=row.get("cid"))
+            if feat_id:
+                try:
+                    feat_id = int(feat_id)
+                except (TypeError, ValueError) as e:
+                    print(f"[dbg] featured_media meta err: {e}")
+            # メタ情報の確認は表示用だけなので --debug の時だけ（投稿ごとの REST 往復を増やさない）
+            if debug and feat_id and hasattr(wp, "_req"):
                 try:
-                    existing_pid = wp.find_post_id_by_external(cid) if cid else None
-                except Exception:
-                    existing_pid = None
+                    meta = wp._req("GET", f"/wp-json/wp/v2/media/{feat_id}",
+                                   params={"_fields": "source_url,media_details"}) or {}
+                    details = meta.get("media_details") or {}
+                    print(f"[dbg] featured_media id={feat_id} {details.get('width')}x{details.get('height')} "
+                          f"src={meta.get('source_url')}")
+                except Exception as e:
+                    print(f"[dbg] featured_media meta err: {e}")
 
-                # 既存を更新しないフラグが立っていて、既存ヒット → スキップ
-                if no_update_existing and existing_pid:
+            # --- 作品ごとのカテゴリ（女優）とタグ ---
+            cat_names, merged_tag_names = _term_names(row)
+            if cat_names:
+                cat_ids_for_post = wp.ensure_categories(cat_names)
+            else:
+                cat_ids_for_post = cat_ids or []
+            tag_ids_for_post = wp.ensure_tags(merged_tag_names)
+
+            # 投稿タイトル整形
+            def _fmt_title(r):
+                cid    = (r.get("cid") or "").strip()
+                t      = (r.get("title") or "").strip()
+                # 著者名（actress_clean があれば優先）
+                author = (r.get("actress_clean") or r.get("actress") or "").strip()
+                # サークル名（maker_clean 優先）
+                circle = (r.get("maker_clean") or r.get("maker") or "").strip()
+
+                # 1) 電子書籍（エロ漫画）: FANZA_BOOK or digital/comic + ebook
+                is_ebook_service = svc in ("digital", "comic") and ("ebook" in floor)
+                if is_books or is_ebook_service:
+                    if author:
+                        return f"[{author}] {t}"
+                    return t  # 著者が取れないときは素のタイトル
+
+                # 2) 同人: service=doujin or floor に doujin を含む
+                if svc == "doujin" or "doujin" in floor:
+                    if circle:
+                        return f"[{circle}] {t}"
+                    # 一応、author があればそっちも使う
+                    if author:
+                        return f"[{author}] {t}"
+                    return t
+
+                # 3) それ以外（動画など）は従来通り [品番] タイトル
+                return f"[{cid}] {t}" if cid else t
+
+            post_kw = dict(
+                title=_fmt_title(row),
+                content=row.get("content", ""),
+                status=status,
+                categories=cat_ids_for_post,
+                tags=tag_ids_for_post,
+                external_id=row.get("cid", ""),
+                meta_extra=meta_extra,
+                excerpt=seo.get("description"),
+                featured_media=feat_id,
+            )
+            if status == "future" and future_datetime:
+                post_kw["date"] = future_datetime
+
+            return post_kw, existing_pid
+
+        wp_pool = _pool(WP_WORKERS) if wp else None
+
+        # ---- 画像ミラー（1作品分）。画像単位の並列は image_mirror 側のプール、ここは作品単位 ----
+        def _mirror_row(row: Dict[str, Any]) -> Dict[str, Any]:
+            cid_for_name = (row.get('cid') or row.get('external_id') or f"post{int(time.time())}").lower()
+            try:
+                row = mirror_item_images(row, wp_mirror, cid_for_name, site_map=mirror_map, map_writer=mirror_writer)
+                # 置換できたかをログで確認（先頭だけ）
+                print(f"[mirror] sample_images[:1] = { (row.get('sample_images') or '').split('|')[:1] }")
+                print(f"[mirror] image_large = { row.get('image_large') }")
+            except Exception as e:
+                print(f"[mirror] skip {cid_for_name}: {e}")
+            return row
+
+        mirror_pool = _pool(WP_WORKERS) if wp_mirror else None
+
+        # ====== API ページ取得（1ページ先読み：処理中に次ページを取りに行く） ======
+        # 要求の間隔は従来どおり --sleep 秒空ける（前ページの取得完了から数える）
+        fetch_pool = ThreadPoolExecutor(max_workers=1)
+        # 目標件数に達して使わなかった先読みは待たずに捨てる
+        stack.callback(fetch_pool.shutdown, wait=False, cancel_futures=True)
+
+        def _fetch_page(start: int, delay: float = 0.0):
+            if delay:
+                time.sleep(delay)
+            return _fetch(args.api_id, args.affiliate_id, params, start=start, hits=args.hits)
+
+        next_page = fetch_pool.submit(_fetch_page, offset)
+
+        # ====== 取得ループ ======
+        while got < args.max and (target_new == 0 or new_count < target_new):
+            data, next_page = next_page.result(), None
+            result = data.get("result") or {}
+            items = result.get("items") or []
+            if not items:
+                break
+            total = result.get("total_count") or 0
+            # 次ページが要りそうなら、このページを処理している間に取得しておく
+            if got + len(items) < args.max and offset + len(items) <= total \
+                    and (target_new == 0 or new_count < target_new):
+                next_page = fetch_pool.submit(_fetch_page, offset + len(items), args.sleep)
+
+            # 最初の要素をダンプ（デバッグ用）
+            if debug and not debug_dumped and items:
+                with open("raw_first_item.json", "w", encoding="utf-8") as f:
+                    json.dump(items[0], f, ensure_ascii=False, indent=2)
+                debug_dumped = True
+
+            # ---- ページ単位の前処理：安い判定から順に絞り込み、重い処理は残った行だけ ----
+            #   標準化 → 重複スキップ → 足切り → apply_filters → HEAD 確認 → ミラー → 本文生成
+            batch: List[Dict[str, Any]] = []
+            wp_rows: List[Dict[str, Any]] = []
+            for it in items:
+                # -- 標準化 --
+                row = _normalize(it)
+
+                # --- CSVベース重複スキップ（記事単位） ---
+                cid = (row.get("cid") or "").strip()
+                if cid and cid in skip_cids:
                     continue
-                
-                # --- SEOメタ生成 ---
-                seo = build_seo_fields(row, site_name=_os.getenv("SITE_NAME") or "")
-                meta_extra = {"provider": "FANZA", **build_wp_seo_meta(seo)}
-
-                # ★ アイキャッチ（ジャケット）— ID最優先で確実に
-                feat_id = row.get("image_large_id") or row.get("trailer_poster_id")
-                if not feat_id:
-                    def _pick_feat_url(r):
-                        # image_large → trailer_poster → samples[0]
-                        return r.get("image_large") or r.get("trailer_poster") \
-                               or ( (r.get("sample_images") or "").split("|")[0] if (r.get("sample_images")) else None )
-                    feat_url = _pick_feat_url(row)
-                    if feat_url:
+
+                # --- （動画のみ）プレイヤーサイズ注入 & iframeサイズ補正 ---
+                if not is_books:
+                    row["player_width"] = W
+                    row["player_height"] = H
+                    row["aspect_ratio"] = ratio  # 例: 56.25
+                    if row.get("trailer_embed"):
+                        row["trailer_embed"] = _EMBED_SIZE_RE.sub(embed_size, row["trailer_embed"])
+
+                # （動画のみ）トレーラーフィールドのサニタイズ
+                if not is_books:
+                    row = sanitize_trailer_fields(row)
+
+                # -- 足切り（ネットワーク不要なもの） --
+                if cheap_filter(row):
+                    batch.append(row)
+
+            # -- 後段フィルタ（キーワード・除外語など）：ページ単位で1回 --
+            batch = apply_filters(batch, args)
+
+            # ---- 画像検証（HEAD 確認があるのでページ内で並列に） ----
+            if probe_pool is not None and len(batch) > 1:
+                batch = list(probe_pool.map(expand_row, batch))
+            else:
+                batch = [expand_row(r) for r in batch]
+
+            # === 画像ミラー（本文生成の直前に実施：直前で上書きされるのを防ぐ。作品単位でページ内並列） ===
+            if wp_mirror:
+                batch = [r for r in batch if r]
+                if mirror_pool is not None and len(batch) > 1:
+                    batch = list(mirror_pool.map(_mirror_row, batch))
+                else:
+                    batch = [_mirror_row(r) for r in batch]
+
+            for row in batch:
+                if not row:
+                    continue
+                cid = (row.get("cid") or "").strip()
+
+                # --- 表示用フィールド（テンプレで使う） ---
+                row["genres_clean"]  = ",".join([g for g in _split_terms(row.get("genres")) if not _is_stopword_term(g)])
+                row["maker_clean"]   = _norm(row.get("maker"))
+                row["actress_clean"] = ",".join(_split_terms(row.get("actress")))
+
+                # -- 本文生成（テンプレ優先。未指定/欠落時は従来HTML）--
+                #    WP 投稿も --outfile も無い / --no-content の CSV 出力なら本文は使わないので作らない
+                if build_content:
+                    if content_template_path:
+                        if not tpl_exists:
+                            log_json("error", where="content_build",
+                                     error=f"template_not_found: {tpl_path}", cid=row.get("cid"))
+                            # テンプレが物理的に無い時だけ従来HTMLへ落とす
+                            row["content"] = "<!-- tpl:missing -->" + \
+                                             _build(row, content_builder=None, max_gallery=max_gallery)
+                        else:
+                            # ① post.html.j2 を直接描画
+                            try:
+                                # ContentBuilderはrender_fileを持たない実装なので、
+                                # build_content_htmlにContentBuilder(template_path=...)を渡して描画する
+                                # （ビルダーはループ前に1回だけ作る。作成時の例外もここで作品ごとに報告）
+                                if tpl_cb_error is not None:
+                                    raise tpl_cb_error.with_traceback(None)
+                                html = _build(row, content_builder=tpl_cb, max_gallery=max_gallery)
+                                row["content"] = "<!-- tpl:post -->" + html
+                            except Exception as e1:
+                                # ここで落ちたら“原因を隠さない”ために安易に content.html.j2 へは落とさない
+                                log_json("error", where="content_build",
+                                         error=f"post_tpl_render_failed: {e1}", cid=row.get("cid"))
+                                # 最低限の保険だけ（従来HTML）。コメントで判別できるようにする
+                                try:
+                                    fallback = _build(row, content_builder=None, max_gallery=max_gallery)
+                                    row["content"] = "<!-- tpl:content(fallback) -->" + fallback
+                                except Exception as e2:
+                                    log_json("error", where="content_build",
+                                             error=f"legacy_build_failed: {e2}", cid=row.get("cid"))
+                                    row["content"] = ""
+                    else:
+                        # テンプレ未指定：従来HTML
+                        row["content"] = "<!-- tpl:content(default) -->" + \
+                                         _build(row, content_builder=None, max_gallery=max_gallery)
+
+                # -- CSV運用（WPなし）の“新規”定義：skip_cids に無い → 新規として採用
+                #    採用したら new_count を加算
+                if not wp:
+                    kept_count += 1
+                    if out_spool:
+                        out_spool.add(row)
+                    if target_new:
+                        new_count += 1
+                    if ledger:
                         try:
-                            if getattr(args, "mirror_images", False):
-                                # ミラー運用：uploads 内から ID を逆引き（再アップしない）
-                                feat_id = _ensure_featured_media_mirrored(wp, feat_url)
-                            else:
-                                # 非ミラー運用：外部から取得してアップロード
-                                feat_id = _ensure_featured_media_external(wp, feat_url, row)
-                        except Exception as e:
-                            log_json("warn", where="featured_media", error=str(e), url=feat_url, cid=row.get("cid"))
-                if feat_id and hasattr(wp, "_req"):
-                    # ここを NameError 無しに修正（det/meta未定義の旧ログを全撤去）
+                            import datetime as _dt
+                            row_for_ledger = dict(row)
+                            row_for_ledger["exported_at"] = _dt.datetime.utcnow().isoformat()
+                            ledger.write(row_for_ledger)
+                        except Exception as _e:
+                            log_json("warn", where="append_ledger", error=str(_e), cid=row.get("cid"))
+                    continue  # WPなしはここで次のアイテムへ
+
+                # -- 直投稿（任意）：ページ分を集めて後でまとめて投稿 --
+                wp_rows.append(row)
+
+            # ---- WP 投稿（I/O 待ちが支配的なのでページ内で並列に。結果の記帳は入力順に1スレッドで） ----
+            if wp_rows:
+                # ページ内のタグ/カテゴリ名をまとめて先に解決（WPClient が batch で作成しキャッシュする）
+                # 既存を更新しない運用では、スキップされる投稿の分まで作らないよう各投稿側に任せる
+                if not no_update_existing:
                     try:
-                        feat_id = int(feat_id)
-                        meta = wp._req("GET", f"/wp-json/wp/v2/media/{feat_id}") or {}
-                        details = meta.get("media_details") or {}
-                        w = details.get("width"); h = details.get("height")
-                        src = meta.get("source_url")
+                        page_cats, page_tags = [], []
+                        for r in wp_rows:
+                            c, t = _term_names(r)
+                            page_cats += c
+                            page_tags += t
+                        if page_cats:
+                            wp.ensure_categories(page_cats)
+                        if page_tags:
+                            wp.ensure_tags(page_tags)
                     except Exception as e:
-                        print(f"[dbg] featured_media meta err: {e}")
-
-                # --- 作品ごとのカテゴリ（女優）とタグを算出 ---
-                actresses = [_norm(x) for x in _split_terms(row.get("actress"))]
-                if actresses:
-                    # カテゴリは“女優名のカテゴリ”を1つだけ付ける（ナビ崩れ防止）
-                    cat_ids_for_post = wp.ensure_categories([actresses[0]])
+                        log_json("warn", where="ensure_terms_prefetch", error=str(e))
+                # 準備（アイキャッチ・ターム等）は作品ごとに並列、投稿本体はページ分まとめて batch で
+                if wp_pool is not None and len(wp_rows) > 1:
+                    prepared = list(wp_pool.map(_prepare_post, wp_rows))
                 else:
-                    cat_ids_for_post = cat_ids or []
-
-                base_tag_names = []
-                for s in (args.wp_tags or "").split(","):
-                    n = _norm(s)
-                    if n and not _is_stopword_term(n):
-                        base_tag_names.append(n)
-
-                dyn_tag_names = []
-                # 女優はタグとしても付与（テーマ側の横断検索に有利）
-                dyn_tag_names += actresses
-                # ジャンル（複数）からノイズ語を除外
-                dyn_tag_names += [g for g in _split_terms(row.get("genres")) if not _is_stopword_term(g)]
-                # 単一値系
-                for key in ("maker", "label", "series"):
-                    v = _norm(row.get(key))
-                    if v and not _is_stopword_term(v):
-                        dyn_tag_names.append(v)
-
-                # 重複除去＋上限
-                seen = set(); merged_tag_names = []
-                for t in base_tag_names + dyn_tag_names:
-                    if t and t not in seen:
-                        seen.add(t); merged_tag_names.append(t)
-                merged_tag_names = merged_tag_names[:15]
-
-                tag_ids_for_post = wp.ensure_tags(merged_tag_names)
-
-                # 投稿タイトル整形
-                def _fmt_title(r):
-                    cid    = (r.get("cid") or "").strip()
-                    t      = (r.get("title") or "").strip()
-                    # 著者名（actress_clean があれば優先）
-                    author = (r.get("actress_clean") or r.get("actress") or "").strip()
-                    # サークル名（maker_clean 優先）
-                    circle = (r.get("maker_clean") or r.get("maker") or "").strip()
-
-                    svc   = (getattr(args, "service", "") or "").lower()
-                    floor = (getattr(args, "floor", "") or "").lower()
-
-                    # 1) 電子書籍（エロ漫画）: FANZA_BOOK or digital/comic + ebook
-                    is_ebook_service = svc in ("digital", "comic") and ("ebook" in floor)
-                    if is_books or is_ebook_service:
-                        if author:
-                            return f"[{author}] {t}"
-                        return t  # 著者が取れないときは素のタイトル
-
-                    # 2) 同人: service=doujin or floor に doujin を含む
-                    if svc == "doujin" or "doujin" in floor:
-                        if circle:
-                            return f"[{circle}] {t}"
-                        # 一応、author があればそっちも使う
-                        if author:
-                            return f"[{author}] {t}"
-                        return t
-
-                    # 3) それ以外（動画など）は従来通り [品番] タイトル
-                    return f"[{cid}] {t}" if cid else t
-
-                if status == "future" and getattr(args, "future_datetime", None):
-                    pid, link = wp.create_or_update_post(
-                        title=_fmt_title(row),
-                        content=row.get("content", ""),
-                        status="future",
-                        categories=cat_ids_for_post,
-                        tags=tag_ids_for_post,
-                        external_id=row.get("cid", ""),
-                        meta_extra=meta_extra,
-                        excerpt=seo.get("description"),
-                        date=args.future_datetime,
-                        featured_media=feat_id,
-                    )
+                    prepared = [_prepare_post(r) for r in wp_rows]
+                todo = [p for p in prepared if p is not None]
+                if hasattr(wp, "create_or_update_posts"):
+                    results = iter(wp.create_or_update_posts([kw for kw, _ in todo], executor=wp_pool))
+                elif wp_pool is not None and len(todo) > 1:
+                    results = wp_pool.map(lambda p: wp.create_or_update_post(**p[0]), todo)
                 else:
-                    pid, link = wp.create_or_update_post(
-                        title=_fmt_title(row),
-                        content=row.get("content", ""),
-                        status=status,
-                        categories=cat_ids_for_post,
-                        tags=tag_ids_for_post,
-                        external_id=row.get("cid", ""),
-                        meta_extra=meta_extra,
-                        excerpt=seo.get("description"),
-                        featured_media=feat_id,
-                    )
-
-                # “新規”だったらカウント（既存→更新のケースは加算しない）
-                if target_new and pid and not existing_pid:
-                    new_count += 1
-
-                # NEW: WP投稿が成功した分だけ ledger に posted_at 付きで記帳
-                try:
-                    if ledger_path and pid:
-                        import datetime as _dt
-                        row_for_ledger = dict(row)
-                        row_for_ledger["posted_at"] = _dt.datetime.utcnow().isoformat()
-                        append_ledger(ledger_path, row_for_ledger)
-                except Exception as _e:
-                    log_json("warn", where="append_ledger", error=str(_e), cid=row.get("cid"))
-
-                log_json("info", action="wp_posted", id=pid, link=link, cid=row.get("cid"))
-
-        got += len(items)
-        offset += len(items)
-        total = result.get("total_count") or 0
-        if offset > total:
-            break
-        time.sleep(args.sleep)
-
-    # ====== CSV 出力（--outfile 指定時） ======
-    if getattr(args, "outfile", None):
-        # 既存のカラムを維持。必要なら fieldnames をプロジェクト都合で拡張可。
-        BASE_FIELDS = [
-            "cid", "title", "URL", "date",
-            "maker", "actress", "genres",
-            "sample_images", "image_large",
-            "trailer_url",        # mp4 直リンク（あれば）
-            "trailer_youtube",    # YouTube ID/URL（あれば）
-            "trailer_poster",     # ポスター画像（あれば）
-            "trailer_embed",      # 生iframe等（通常は空）
-            "content",
-            "aspect_ratio",
-        ]
-        all_keys = set()
-        for r in out_rows:
-            all_keys.update(r.keys())
-
-        fieldnames = [c for c in BASE_FIELDS if c in all_keys] + \
-                    [c for c in all_keys if c not in BASE_FIELDS]  # ← player_width 等も書ける
-
-        with open(args.outfile, "w", newline="", encoding="utf-8-sig") as f:
-            w = csv.DictWriter(f, fieldnames=fieldnames)
-            w.writeheader()
-            w.writerows(out_rows)
+                    results = (wp.create_or_update_post(**kw) for kw, _ in todo)
+                posted = [None if p is None else (*next(results), p[1]) for p in prepared]
+                for row, res in zip(wp_rows, posted):
+                    if res is None:
+                        continue
+                    pid, link, existing_pid = res
+
+                    # “新規”だったらカウント（既存→更新のケースは加算しない）
+                    if target_new and pid and not existing_pid:
+                        new_count += 1
+
+                    # NEW: WP投稿が成功した分だけ ledger に posted_at 付きで記帳
+                    try:
+                        if ledger and pid:
+                            import datetime as _dt
+                            row_for_ledger = dict(row)
+                            row_for_ledger["posted_at"] = _dt.datetime.utcnow().isoformat()
+                            ledger.write(row_for_ledger)
+                    except Exception as _e:
+                        log_json("warn", where="append_ledger", error=str(_e), cid=row.get("cid"))
+
+                    log_json("info", action="wp_posted", id=pid, link=link, cid=row.get("cid"))
+
+            got += len(items)
+            offset += len(items)
+            if offset > total:
+                break
+
+        # ====== CSV 出力（--outfile 指定時） ======
+        if out_spool:
+            out_spool.write_csv(args.outfile)
 
     return {
         "fetched": got,
-        "kept": len(out_rows),
+        "kept": kept_count,
         "wp_posted": None,  # 各行はログ出力済み
         "outfile": getattr(args, "outfile", None),
         "status": "ok",
@@ -1,5 +1,7 @@
 import re, os
 
+_CID_RE = re.compile(r"([A-Z]+)[-_]?(0*)(\d+)")  # 品番: 英字 + 任意の区切り + 数字
+
 def _cut(s: str, n: int) -> str:
     s = (s or "").strip()
     return s if len(s) <= n else s[:n].rstrip() + "…"
@@ -10,7 +12,7 @@ def _cid_variants(cid: str) -> list[str]:
     s = (cid or "").strip().upper().replace(" ", "")
     if not s:
         return []
-    m = re.match(r"([A-Z]+)[-_]?(0*)(\d+)", s)
+    m = _CID_RE.match(s)
     if not m:
         return [s]
     pre, zeros, num = m.groups()
@@ -18,12 +20,8 @@ def _cid_variants(cid: str) -> list[str]:
     return [f"{pre}-{num_no_zero}", f"{pre}{num_no_zero}", f"{pre}-{num}", f"{pre}{num}", s]
 
 def _dedup(seq):
-    """順序維持で重複除去"""
-    seen = set(); out = []
-    for x in seq:
-        if x and x not in seen:
-            out.append(x); seen.add(x)
-    return out
+    """順序維持で重複除去（空要素は捨てる）"""
+    return list(dict.fromkeys(filter(None, seq)))
 
 
 def build_seo_fields(row, site_name=None):
@@ -1,12 +1,54 @@
 # app/core/wp_rest.py
 import base64
+import random
 import time
+import threading
 import requests
+from requests.adapters import HTTPAdapter
 from typing import List, Tuple, Optional
-import os, mimetypes
+import os, mimetypes, tempfile
 from urllib.parse import urlparse
+from datetime import datetime, timezone
+from email.utils import parsedate_to_datetime
+
+try:
+    from requests_toolbelt import MultipartEncoder  # optional（multipart 本体をメモリに組み立てずストリーム送信）
+except Exception:
+    MultipartEncoder = None
+
+RETRY_BASE = 1.5   # 秒。i 回目の待ちは [0, min(RETRY_CAP, RETRY_BASE * 2**i)) の一様乱数
+RETRY_CAP = 30.0
+RETRY_AFTER_MAX = 120.0  # Retry-After が極端に長い時の上限
+
+
+def _retry_after(r) -> float | None:
+    """Retry-After ヘッダ（秒 or HTTP-date）を秒で返す。無い/読めなければ None。"""
+    v = (r.headers.get("Retry-After") or "").strip()
+    if not v:
+        return None
+    if v.isdigit():
+        return float(v)
+    try:
+        dt = parsedate_to_datetime(v)
+        return max(0.0, (dt - datetime.now(timezone.utc)).total_seconds())
+    except (TypeError, ValueError):
+        return None
+
+
+def _retry_delay(r, i: int) -> float:
+    """429/5xx の再試行までの待ち秒。full jitter（同時に弾かれたクライアントが揃って再送しない）、
+    サーバが Retry-After をくれればそれを下限にする。"""
+    delay = random.uniform(0, min(RETRY_CAP, RETRY_BASE * 2 ** i))
+    ra = _retry_after(r)
+    if ra is not None:
+        delay = max(delay, min(ra, RETRY_AFTER_MAX))
+    return delay
+
 
 class WPClient:
+    BATCH_MAX = 25  # batch/v1 の1リクエストあたり上限（WP 既定）
+    BATCH_POST_TIMEOUT = 4.0  # 投稿 batch の読み取りタイムアウト（1件あたり秒。25件で100秒）
+
     def __init__(self, base_url: str, user: str, app_pass: str, timeout=30.0):
         self.base = base_url.rstrip("/")
         token = f"{user}:{app_pass}".encode("utf-8")
@@ -16,18 +58,33 @@ class WPClient:
             "Content-Type": "application/json; charset=utf-8",
         }
         self.timeout = timeout
+        # 投稿・ターム・メディアの REST 呼び出しで TCP/TLS 接続を使い回す（並列投稿でも溢れない大きさ）
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=16, pool_maxsize=16)
+        self.session.mount("https://", adapter)
+        self.session.mount("http://", adapter)
+        # (taxonomy, 小文字の名前) -> term ID。投稿ごとに同じタグを検索し直さない
+        self._term_ids: dict[tuple[str, str], int] = {}
+        self._term_lock = threading.Lock()
+        self._batch_ok = True
+        self._post_batch_ok = True  # 投稿ルートの batch 可否はタームとは別（allow_batch はルート毎）
+        # external_id -> post ID（None は“未投稿”）。存在確認と create_or_update_post の再検索を1回にまとめる
+        self._post_ids: dict[str, Optional[int]] = {}
+        # サイト側で meta_key/meta_value フィルタが効いているか（None=未確認）。効いている時だけ1件取得にする
+        self._meta_filter_ok: Optional[bool] = None
 
-    def _req(self, method: str, path: str, **kw):
+    def _req(self, method: str, path: str, *, tries: int = 5, **kw):
         url = f"{self.base}{path}"
         headers = kw.pop("headers", {})
+        timeout = kw.pop("timeout", self.timeout)
         # JSONエンドポイント用の既定ヘッダをマージ
         for k, v in self.headers_json.items():
             headers.setdefault(k, v)
 
-        for i in range(5):
-            r = requests.request(method, url, headers=headers, timeout=self.timeout, **kw)
-            if r.status_code in (429, 500, 502, 503, 504):
-                time.sleep(1.5 * (i + 1))
+        for i in range(tries):
+            r = self.session.request(method, url, headers=headers, timeout=timeout, **kw)
+            if r.status_code in (429, 500, 502, 503, 504) and i < tries - 1:
+                time.sleep(_retry_delay(r, i))
                 continue
             r.raise_for_status()
             # 201/200 いずれも JSON を返す
@@ -72,79 +129,160 @@ class WPClient:
                 pass
             raise
 
-    def ensure_tags(self, names: list[str]) -> list[int]:
-        """タグ名リストから term IDs を取得/作成。空要素は除外し、重複IDも除去。"""
+    def batch(self, reqs: list[dict], tries: int = 5, timeout: float | None = None) -> list[dict]:
+        """
+        /wp-json/batch/v1（WP 5.6+）で最大 BATCH_MAX 件のリクエストを1往復で送る。
+        reqs: [{"method": "POST", "path": "/wp/v2/tags", "body": {...}}, ...]
+        返り値: 各リクエストの {"status", "body", "headers"}（入力順）
+        tries=1 なら 5xx でも送り直さない（途中まで実行済みかもしれない書き込み用）
+        timeout 省略時はクライアント既定（投稿のように1件が重い batch は長めに渡す）
+        """
+        res = self._req("POST", "/wp-json/batch/v1", tries=tries,
+                        timeout=timeout or self.timeout,
+                        json={"validation": "normal", "requests": reqs})
+        return (res or {}).get("responses") or []
+
+    def _ensure_terms(self, tax: str, names: list[str]) -> list[int]:
+        """
+        names の term IDs を返す（空要素・重複IDは除外）。
+        - run 中に解決済みの名前はキャッシュから返す
+        - 未解決分は batch で一括作成（既存なら term_exists の term_id を使う）
+        - batch が使えない/失敗した分だけ従来の _ensure_term で1件ずつ
+        """
+        uniq = list(dict.fromkeys(nm for nm in ((raw or "").strip() for raw in names or []) if nm))
+        with self._term_lock:
+            missing = [nm for nm in uniq if (tax, nm.lower()) not in self._term_ids]
+
+        if missing and self._batch_ok:
+            for i in range(0, len(missing), self.BATCH_MAX):
+                chunk = missing[i:i + self.BATCH_MAX]
+                try:
+                    responses = self.batch([
+                        {"method": "POST", "path": f"/wp/v2/{tax}", "body": {"name": nm}} for nm in chunk
+                    ])
+                except Exception:
+                    # batch 非対応（WP 5.6 未満など）→ 以降は使わない
+                    self._batch_ok = False
+                    break
+                for nm, r in zip(chunk, responses):
+                    body = (r or {}).get("body") or {}
+                    if body.get("code") == "rest_batch_not_allowed":
+                        # このエンドポイントは batch 不可のサイト → 以降は使わない
+                        self._batch_ok = False
+                        break
+                    tid = body.get("id")
+                    if tid is None and body.get("code") == "term_exists":
+                        tid = (body.get("data") or {}).get("term_id")
+                    if isinstance(tid, int):
+                        with self._term_lock:
+                            self._term_ids[(tax, nm.lower())] = tid
+                if not self._batch_ok:
+                    break
+
         ids, seen = [], set()
-        for raw in names or []:
-            nm = (raw or "").strip()
-            if not nm:
-                continue
-            tid = self._ensure_term("tags", nm)
+        for nm in uniq:
+            with self._term_lock:
+                tid = self._term_ids.get((tax, nm.lower()))
+            if tid is None:
+                tid = self._ensure_term(tax, nm)
+                if isinstance(tid, int):
+                    with self._term_lock:
+                        self._term_ids[(tax, nm.lower())] = tid
             if isinstance(tid, int) and tid not in seen:
                 ids.append(tid); seen.add(tid)
         return ids
 
+    def ensure_tags(self, names: list[str]) -> list[int]:
+        """タグ名リストから term IDs を取得/作成。空要素は除外し、重複IDも除去。"""
+        return self._ensure_terms("tags", names)
+
     def ensure_categories(self, names: list[str]) -> list[int]:
         """カテゴリ名リストから term IDs を取得/作成。空要素は除外し、重複IDも除去。"""
-        ids, seen = [], set()
-        for raw in names or []:
-            nm = (raw or "").strip()
-            if not nm:
-                continue
-            tid = self._ensure_term("categories", nm)
-            if isinstance(tid, int) and tid not in seen:
-                ids.append(tid); seen.add(tid)
-        return ids
+        return self._ensure_terms("categories", names)
 
     def find_post_id_by_external(self, external_id: str) -> Optional[int]:
         eid = (external_id or "").strip()
         if not eid:
             return None
+        if eid in self._post_ids:
+            return self._post_ids[eid]
+        pid = self._find_post_id_by_external(eid)
+        self._post_ids[eid] = pid
+        return pid
+
+    def _find_post_id_by_external(self, eid: str) -> Optional[int]:
+        # meta_key/meta_value はサイト側フィルタ依存（無いと WP は無視して最新記事を返す）。
+        # フィルタが効くと確認できるまでは従来どおり10件取って厳密一致を探す
+        per_page = 1 if self._meta_filter_ok else 10
         q = (
             "/wp-json/wp/v2/posts"
             f"?meta_key=external_id&meta_value={requests.utils.quote(eid)}"
-            "&per_page=10"
-                "&status=publish,draft,future,pending,private"
+            f"&per_page={per_page}"
+            "&status=publish,draft,future,pending,private"
             "&context=edit"
-            "&_fields=id,meta,modified"
+            "&_fields=id,meta"
         )
         res = self._req("GET", q)
         if not isinstance(res, list):
             return None
-        for p in res:
-            if (p.get("meta") or {}).get("external_id") == eid:  # ← 厳密一致
-                return p["id"]
-        return None
+        hits = [p for p in res if (p.get("meta") or {}).get("external_id") == eid]  # ← 厳密一致
+        if len(hits) < len(res):
+            # 一致しない記事が混ざった → フィルタは効いていない
+            if self._meta_filter_ok:
+                self._meta_filter_ok = False
+                return self._find_post_id_by_external(eid)  # 10件で取り直す
+            self._meta_filter_ok = False
+        elif hits and self._meta_filter_ok is None:
+            self._meta_filter_ok = True
+        return hits[0]["id"] if hits else None
 
 
+    def upload_media(self, files: dict, data: dict | None = None) -> dict:
+        """
+        multipart で /wp-json/wp/v2/media へアップロードし、media の JSON（id / source_url 等）を返す。
+        files は requests の形式: {"file": (name, bytes または file object, content_type)}
+        """
+        headers = {"Authorization": self.auth}
+        if MultipartEncoder is not None:
+            # ファイルは読みながら送る（requests の files= は本体全体を bytes で組み立てる）
+            enc = MultipartEncoder(fields={**(data or {}), **files})
+            headers["Content-Type"] = enc.content_type
+            r = self.session.post(f"{self.base}/wp-json/wp/v2/media",
+                                  headers=headers, data=enc, timeout=self.timeout)
+        else:
+            # multipart では Content-Type を自前で付けない（requests が boundary を付与）
+            r = self.session.post(f"{self.base}/wp-json/wp/v2/media",
+                                  headers=headers, files=files, data=data, timeout=self.timeout)
+        r.raise_for_status()
+        return r.json()
+
     def upload_media_from_url(self, url: str, filename: str | None = None) -> int:
         """
         画像URLをGET→ /wp-json/wp/v2/media へ multipart でアップロードして添付IDを返す。
+        画像はメモリに丸ごと載せず、一時ファイルへストリームしてから送る。
         """
-        resp = requests.get(url, timeout=20)
-        resp.raise_for_status()
-
         path = urlparse(url).path
         name = filename or (os.path.basename(path) or "image.jpg")
         ctype = mimetypes.guess_type(name)[0] or "image/jpeg"
 
-        files = {"file": (name, resp.content, ctype)}
-        # multipart では Content-Type を自前で付けない（requests が boundary を付与）
-        headers = {"Authorization": self.auth}
-        r = requests.post(f"{self.base}/wp-json/wp/v2/media",
-                          headers=headers, files=files, timeout=self.timeout)
-        r.raise_for_status()
-        return r.json()["id"]
+        with tempfile.SpooledTemporaryFile(max_size=2_000_000) as spool:
+            with self.session.get(url, timeout=20, stream=True) as resp:
+                resp.raise_for_status()
+                for chunk in resp.iter_content(64 * 1024):
+                    spool.write(chunk)
+            spool.seek(0)
+            return self.upload_media({"file": (name, spool, ctype)})["id"]
 
-    def create_or_update_post(
-        self, *,
+    @staticmethod
+    def _post_payload(
+        *,
         title: str, content: str, status: str,
         categories: List[int], tags: List[int],
         external_id: str, meta_extra: dict | None = None,
         excerpt: Optional[str] = None,
         date: str | None = None,
         featured_media: Optional[int] = None
-    ) -> Tuple[int, str]:
+    ) -> dict:
         payload = {
             "title": title,
             "content": content,
@@ -159,10 +297,91 @@ class WPClient:
             payload["date"] = date
         if featured_media:
             payload["featured_media"] = featured_media
+        return payload
+
+    def create_or_update_post(
+        self, *,
+        title: str, content: str, status: str,
+        categories: List[int], tags: List[int],
+        external_id: str, meta_extra: dict | None = None,
+        excerpt: Optional[str] = None,
+        date: str | None = None,
+        featured_media: Optional[int] = None
+    ) -> Tuple[int, str]:
+        payload = self._post_payload(
+            title=title, content=content, status=status,
+            categories=categories, tags=tags,
+            external_id=external_id, meta_extra=meta_extra,
+            excerpt=excerpt, date=date, featured_media=featured_media,
+        )
 
         pid = self.find_post_id_by_external(external_id)
         if pid:
             res = self._req("POST", f"/wp-json/wp/v2/posts/{pid}", json=payload)
         else:
             res = self._req("POST", "/wp-json/wp/v2/posts", json=payload)
+        self._post_ids[(external_id or "").strip()] = res["id"]
         return res["id"], res.get("link", "")
+
+    def create_or_update_posts(self, items: list[dict], executor=None) -> list[Tuple[int, str]]:
+        """
+        create_or_update_post の複数件版。items は create_or_update_post のキーワード引数の dict。
+        - batch/v1 で BATCH_MAX 件ずつまとめて作成/更新（投稿ルートが allow_batch の時だけ）
+        - batch が使えない/個別に失敗した分は create_or_update_post で1件ずつ（例外もそちらから上げる）
+          batch を止めるのは実行前の拒否（4xx / rest_batch_not_allowed）だけ。タイムアウト・5xx の塊は
+          作成済みかもしれないので存在確認し直してから送る
+          executor（ThreadPoolExecutor 等）を渡せばその1件ずつを並列に
+        返り値: 各 item の (post ID, link)（入力順）
+        """
+        out: list[Optional[Tuple[int, str]]] = [None] * len(items)
+        sent: list[int] = []
+        for i in range(0, len(items), self.BATCH_MAX):
+            if not self._post_batch_ok:
+                break
+            idx = range(i, min(i + self.BATCH_MAX, len(items)))
+            reqs = []
+            for j in idx:
+                pid = self.find_post_id_by_external(items[j]["external_id"])
+                reqs.append({
+                    "method": "POST",
+                    "path": f"/wp/v2/posts/{pid}" if pid else "/wp/v2/posts",
+                    "body": self._post_payload(**items[j]),
+                })
+            sent.extend(idx)
+            try:
+                # 失敗しても送り直さない（途中まで作成済みだと重複投稿になる）
+                responses = self.batch(reqs, tries=1,
+                                       timeout=max(self.timeout, self.BATCH_POST_TIMEOUT * len(reqs)))
+            except requests.HTTPError as e:
+                code = e.response.status_code if e.response is not None else 0
+                if 400 <= code < 500 and code not in (408, 429):
+                    # batch ルートが無い/受け付けない（実行前に拒否された）→ 以降は1件ずつ
+                    self._post_batch_ok = False
+                    break
+                continue  # 5xx 等は実行済みかもしれない → この塊は下で存在確認し直して1件ずつ
+            except Exception:
+                continue  # タイムアウト/切断等も同様（WP 側で作成済みかもしれない）
+            for j, r in zip(idx, responses):
+                body = (r or {}).get("body") or {}
+                if body.get("code") == "rest_batch_not_allowed":
+                    # 投稿ルートが batch 不可のサイト → 以降は使わない
+                    self._post_batch_ok = False
+                    break
+                if (r or {}).get("status") in (200, 201) and isinstance(body.get("id"), int):
+                    self._post_ids[(items[j]["external_id"] or "").strip()] = body["id"]
+                    out[j] = (body["id"], body.get("link", ""))
+
+        for j in sent:
+            if out[j] is None:
+                # batch で送ったのに結果が取れなかった分は作成済みかもしれない
+                # → キャッシュを捨て、create_or_update_post の存在確認からやり直す（作成済みなら更新になる）
+                self._post_ids.pop((items[j]["external_id"] or "").strip(), None)
+        rest = [j for j in range(len(items)) if out[j] is None]
+        post_one = lambda j: self.create_or_update_post(**items[j])
+        if executor is not None and len(rest) > 1:
+            done = list(executor.map(post_one, rest))
+        else:
+            done = [post_one(j) for j in rest]
+        for j, res in zip(rest, done):
+            out[j] = res
+        return out
@@ -1,8 +1,10 @@
 import re
 
+_BRACKET_RE = re.compile(r"【.*?】")
+
 def transform(item, html: str) -> str:
     # タイトルの余計な記号を除去
-    html = re.sub(r"【.*?】", "", html)
+    html = _BRACKET_RE.sub("", html)
 
     # NGワードをマスク
     for w in ["過激表現A", "過激表現B"]:
@@ -6,9 +6,16 @@ from urllib.parse import urlsplit, urlunsplit, parse_qsl, urlencode
 from app.core.content_builder import ContentBuilder
 from typing import Optional, Dict, Any, List
 from jinja2 import Environment, FileSystemLoader, select_autoescape
+from requests.adapters import HTTPAdapter
 
 API_ENDPOINT = "https://api.dmm.com/affiliate/v3/ItemList"
 
+# API 取得・画像/動画の HEAD 確認で共有するセッション（同一ホストへの TCP/TLS 接続を使い回す）
+_SESSION = requests.Session()
+_ADAPTER = HTTPAdapter(pool_connections=16, pool_maxsize=32)  # ページ内の並列 HEAD でも溢れない大きさ
+_SESSION.mount("https://", _ADAPTER)
+_SESSION.mount("http://", _ADAPTER)
+
 def get_player_size_from_env(default="1280_720"):
     s = os.getenv("FANZA_IFRAME_SIZE", default)
     try:
@@ -64,7 +71,7 @@ def _resolve_litevideo_to_mp4(cid: str, timeout: float = 3.0) -> str | None:
     """freepv MP4 候補に HEAD を打ち、200 かつ video/mp4 っぽいものを返す。"""
     for url in _guess_preview_mp4_urls(cid):
         try:
-            r = requests.head(url, allow_redirects=True, timeout=timeout)
+            r = _SESSION.head(url, allow_redirects=True, timeout=timeout)
             if r.status_code == 200:
                 ctype = (r.headers.get("Content-Type") or "").lower()
                 if "video" in ctype and "mp4" in ctype:
@@ -96,6 +103,9 @@ def _extract_trailer_fields(it: dict) -> dict:
         it.get("imageURL") or
         None
     )
+    # imageURL は {large,list,small} の dict で来るので、ここで URL 文字列に揃える
+    if isinstance(poster, dict):
+        poster = poster.get("large") or poster.get("list") or poster.get("small") or None
 
     if isinstance(raw_url, str) and raw_url:
         ul = raw_url.strip().lower()
@@ -193,7 +203,7 @@ def fetch_items(api_id, affiliate_id, params, start=1, hits=100):
     if cid := params.get("cid"): q["cid"] = cid
     if gte := params.get("gte_date"): q["gte_date"] = gte
     if lte := params.get("lte_date"): q["lte_date"] = lte
-    r = requests.get(API_ENDPOINT, params=q, timeout=30)
+    r = _SESSION.get(API_ENDPOINT, params=q, timeout=30)
     r.raise_for_status()
     return r.json()
 
@@ -206,6 +216,16 @@ def _clean_query_keep_webp(u: str) -> str:
     except Exception:
         return u
 
+# プレースホルダ画像URLに含まれる部分文字列（小文字）。正規表現は使わず部分一致だけで判定する
+# プレースホルダ系の部分文字列（呼び出し箇所ごとに従来の判定語をそのまま保つ）
+_PLACEHOLDER_NEEDLES = ("now_print", "nowprinting", "noimage", "no_image", "nopic", "noimg")
+_NOW_PRINTING_NEEDLES = ("now_printing", "nowprinting", "noimage", "no_image", "nopic", "noimg")
+_FINAL_URL_NEEDLES = ("now_print", "nowprinting", "noimage", "no_image")  # HEAD のリダイレクト先
+
+def _has_placeholder_needle(s: str, needles: tuple = _PLACEHOLDER_NEEDLES) -> bool:
+    """小文字化済みの s に needles のどれかが含まれるか"""
+    return any(map(s.__contains__, needles))
+
 def _upgrade_dmm_size(u: str) -> str:
     """
     DMM画像URLの“小→大”昇格を一括で行う。
@@ -221,7 +241,7 @@ def _upgrade_dmm_size(u: str) -> str:
 
     low = u.lower()
     is_dmm = ("dmm.co.jp" in low) or ("dmm.com" in low)
-    if "now_print" in low or "nowprinting" in low or "noimage" in low or "no_image" in low or "nopic" in low or "noimg" in low:
+    if _has_placeholder_needle(low):
         return ""
     if is_dmm:
         # サンプル 小→大（js → jp）
@@ -241,11 +261,11 @@ def _upgrade_dmm_size(u: str) -> str:
 
 def _head_ok(url: str, timeout: float = 4.0) -> bool:
     try:
-        r = requests.head(url, allow_redirects=True, timeout=timeout)
+        r = _SESSION.head(url, allow_redirects=True, timeout=timeout)
         if r.status_code == 200:
             ctype = (r.headers.get("Content-Type") or "").lower()
             return ("image" in ctype)
-        r = requests.get(url, stream=True, timeout=timeout)
+        r = _SESSION.get(url, stream=True, timeout=timeout)
         ok = (r.status_code == 200)
         try: r.close()
         except Exception: pass
@@ -290,33 +310,40 @@ def _is_large_hint(u: str) -> bool:
 
 def _is_now_printing_url_like(u: str) -> bool:
     if not u: return True
-    s = u.lower()
-    return ("now_printing" in s) or ("nowprinting" in s) or ("noimage" in s) or ("no_image" in s) or ("nopic" in s) or ("noimg" in s)
+    return _has_placeholder_needle(u.lower(), _NOW_PRINTING_NEEDLES)
 
 def _fast_placeholder_heuristic(u: str) -> bool:
     """URLだけで高速に判定（placeholder系）"""
     if not u:
         return True
-    s = u.lower()
-    return ("now_print" in s) or ("nowprinting" in s) or ("noimage" in s) or ("no_image" in s) or ("nopic" in s) or ("noimg" in s)
+    return _has_placeholder_needle(u.lower())
 
 def _probe_is_placeholder(u: str, timeout: float = 8.0, verify: bool = True, use_network: bool = True) -> bool:
     """プレースホルダ判定: ヒューリスティック → 任意でHEAD確認"""
+    return _probe_placeholder_status(u, timeout=timeout, verify=verify, use_network=use_network)[0]
+
+def _probe_placeholder_status(u: str, timeout: float = 8.0, verify: bool = True,
+                              use_network: bool = True) -> tuple[bool, bool]:
+    """
+    _probe_is_placeholder の本体。(判定, 確定か) を返す。
+    HEAD の通信エラー/タイムアウト/429・5xx は“確定でない”（呼び出し側でメモ化しない）。
+    """
     if _fast_placeholder_heuristic(u):
-        return True
+        return True, True
     if (not use_network) or (not u):
-        return False
+        return False, True
     try:
-        r = requests.head(u, allow_redirects=True, timeout=timeout, verify=verify)
+        r = _SESSION.head(u, allow_redirects=True, timeout=timeout, verify=verify)
+        definite = not (r.status_code == 429 or r.status_code >= 500)
         final = (r.url or "").lower()
-        if "now_print" in final or "nowprinting" in final or "noimage" in final or "no_image" in final:
-            return True
+        if _has_placeholder_needle(final, _FINAL_URL_NEEDLES):
+            return True, definite
         cl = r.headers.get("Content-Length")
         if cl and cl.isdigit() and int(cl) < 15000:
-            return True
+            return True, definite
     except Exception:
-        return False
-    return False
+        return False, False
+    return False, definite
 
 def _pick_best_feature(sample_urls: list[str]) -> str:
     if not sample_urls: return ""
@@ -357,11 +384,7 @@ def _extract_sample_images(it):
     for key in ("sampleImageURL","sampleImageURLS","sampleImage","sampleimage","iteminfo"):
         if key in it: _collect(it[key])
 
-    seen, uniq = set(), []
-    for u in urls:
-        if u and (u not in seen):
-            seen.add(u)
-            uniq.append(u)
+    uniq = list(dict.fromkeys(filter(None, urls)))  # 順序維持で重複除去
 
     def _score(u: str) -> int:
         s = u.lower()
@@ -1,12 +1,12 @@
 # app/providers/fanza_book.py
 
-import requests
 from typing import Dict, Any, List
 from urllib.parse import urlencode
 
 # 既存の config を流用（API_ID / AFFILIATE_ID など）
 from app.core import config as CFG
 from app.core.config import make_aff_url  # 動画側と同じ helper を再利用
+from app.providers.fanza import _SESSION  # API 接続も動画側と共有
 
 API_ENDPOINT = "https://api.dmm.com/affiliate/v3/ItemList"
 
@@ -65,7 +65,7 @@ def fetch_items(api_id: str, affiliate_id: str, params: Dict[str, Any],
             q[k] = v
 
     url = f"{API_ENDPOINT}?{urlencode(q)}"
-    r = requests.get(url, timeout=10)
+    r = _SESSION.get(url, timeout=10)
     r.raise_for_status()
     return r.json()
 
@@ -113,12 +113,7 @@ def _pick_sample_urls(prod: Dict[str, Any], max_count: int = 12) -> List[str]:
     _collect(arr_raw)
 
     # 重複除去＋順序維持
-    seen = set()
-    out: List[str] = []
-    for u in urls:
-        if u and u not in seen:
-            seen.add(u)
-            out.append(u)
+    out: List[str] = list(dict.fromkeys(filter(None, urls)))
 
     return out[:max_count]
 
@@ -0,0 +1,107 @@
+from urllib.parse import parse_qs, quote, unquote, urlparse
+
+import pytest
+
+from app.core import config
+
+REDIRECT_HOSTS = {"al.dmm.com", "al.fanza.co.jp", "al.dmm.co.jp"}
+
+
+# ---- 従来実装（最適化前の config.py をそのまま写したもの） ----
+def _base_is_aff_redirect(url):
+    try:
+        host = urlparse(url).netloc.lower()
+    except Exception:
+        return False
+    return any(host.endswith(h) for h in REDIRECT_HOSTS)
+
+
+def _base_extract_lurl(url):
+    try:
+        vals = parse_qs(urlparse(url).query).get("lurl", [])
+        return unquote(vals[0]) if vals else None
+    except Exception:
+        return None
+
+
+def _base_unwrap_aff_url(url, max_hops=5):
+    inner, hops = url, 0
+    while _base_is_aff_redirect(inner) and hops < max_hops:
+        nxt = _base_extract_lurl(inner)
+        if not nxt:
+            break
+        inner, hops = nxt, hops + 1
+    return inner
+
+
+def _base_make_aff_url(base, link_id, redirect, ch):
+    if not base:
+        return ""
+    final = _base_unwrap_aff_url(base)
+    if link_id and redirect:
+        aff = f"{redirect}/?lurl={quote(final, safe='')}&af_id={link_id}"
+        if ch:
+            aff += f"&ch={quote(ch, safe='')}"
+        return aff
+    return base
+
+
+PLAIN = "https://video.dmm.co.jp/av/content/?id=abc00001"
+URLS = [
+    "",
+    PLAIN,
+    "https://www.dmm.co.jp/digital/videoa/-/detail/=/cid=abc00001/",
+    f"https://al.dmm.com/?lurl={quote(PLAIN, safe='')}&af_id=old-001",
+    f"https://al.fanza.co.jp/?lurl={quote('https://al.dmm.com/?lurl=' + quote(PLAIN, safe='') + '&af_id=x', safe='')}&af_id=y",
+    f"https://AL.DMM.CO.JP/?af_id=z&lurl={quote(PLAIN, safe='')}",
+    "https://al.dmm.com/?af_id=no-lurl",
+    f"https://al.dmm.com/?lurl={quote('https://video.dmm.co.jp/?q=a+b&x=%E3%81%82', safe='')}",
+    "https://al.dmm.com/?lurl=https://video.dmm.co.jp/a+b",
+    "https://example.com/?lurl=https://video.dmm.co.jp/",
+    "https://al.dmm.com:8443/?lurl=https%3A%2F%2Fvideo.dmm.co.jp%2F",
+    "https://al.dmm.com:443/?lurl=https%3A%2F%2Fvideo.dmm.co.jp%2F",
+    "https://al.dmm.com/?lurl=&lurl=https%3A%2F%2Fvideo.dmm.co.jp%2F",
+    "https://user@al.dmm.com/?lurl=https%3A%2F%2Fvideo.dmm.co.jp%2F",
+    "not a url",
+]
+
+
+def _clear_url_caches(mod):
+    for fn in (mod._url_host, mod._url_path, mod._is_aff_redirect, mod._extract_lurl, mod._unwrap_aff_url):
+        fn.cache_clear()
+
+
+@pytest.fixture(autouse=True)
+def _fresh_caches():
+    _clear_url_caches(config)
+    yield
+    _clear_url_caches(config)
+
+
+@pytest.mark.parametrize("url", URLS)
+def test_unwrap_aff_url_matches_baseline(url):
+    assert config._unwrap_aff_url(url) == _base_unwrap_aff_url(url)
+
+
+@pytest.fixture
+def aff_env(monkeypatch):
+    monkeypatch.setenv("FANZA_LINK_AFFILIATE_ID", "site-990")
+    monkeypatch.setenv("AFFILIATE_REDIRECT", "https://al.dmm.com")
+    monkeypatch.setenv("AFFILIATE_CH", "toolbar&x")
+    monkeypatch.setattr(config, "_AFF_PREFIX", "https://al.dmm.com/?lurl=")
+    monkeypatch.setattr(config, "_AFF_SUFFIX", "&af_id=site-990&ch=" + quote("toolbar&x", safe=""))
+    monkeypatch.setattr(config, "LINK_AFFILIATE_ID", "site-990")
+    monkeypatch.setattr(config, "AFFILIATE_REDIRECT", "https://al.dmm.com")
+    return config
+
+
+@pytest.mark.parametrize("url", URLS)
+def test_make_aff_url_matches_baseline(aff_env, url):
+    want = _base_make_aff_url(url, "site-990", "https://al.dmm.com", "toolbar&x")
+    assert aff_env.make_aff_url(url) == want
+
+
+@pytest.mark.parametrize("url", URLS)
+def test_make_aff_url_unconfigured_returns_base(monkeypatch, url):
+    monkeypatch.setattr(config, "LINK_AFFILIATE_ID", "")
+    assert config.make_aff_url(url) == _base_make_aff_url(url, "", "https://al.dmm.com", "")
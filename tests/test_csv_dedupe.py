@@ -0,0 +1,114 @@
+import csv
+
+import pytest
+
+from app.core import csv_dedupe
+
+
+def _write_outfile_like(path, n=20000):
+    # --outfile 相当（content 列に改行）。pyarrow のブロック（1MB）を跨ぐ大きさにする
+    with open(path, "w", encoding="utf-8-sig", newline="") as f:
+        w = csv.writer(f)
+        w.writerow(["cid", "title", "content", "URL"])
+        for i in range(n):
+            w.writerow([f"abc{i:05d}", f"Title {i}", f"<p>line1</p>\n<p>line2, {i}</p>\n" + "x" * 200, f"https://x/{i}"])
+
+
+def test_read_column_values_multiline_uses_pyarrow(tmp_path, monkeypatch):
+    pytest.importorskip("pyarrow")
+    path = tmp_path / "out.csv"
+    _write_outfile_like(path)
+
+    def _no_fallback(*a, **kw):
+        raise AssertionError("csv module fallback was used")
+
+    monkeypatch.setattr(csv_dedupe.csv, "DictReader", _no_fallback)
+    got = csv_dedupe._read_column_values(str(path), "cid")
+    assert got == {f"abc{i:05d}" for i in range(20000)}
+
+
+def test_ledger_rows_reach_disk_before_close(tmp_path):
+    path = tmp_path / "ledger.csv"
+    lw = csv_dedupe.LedgerWriter(str(path))
+    try:
+        lw.write({"cid": "abc00001", "posted_at": "2024-01-01T00:00:00"})
+        with open(path, encoding="utf-8-sig", newline="") as f:
+            rows = list(csv.DictReader(f))
+        assert [r["cid"] for r in rows] == ["abc00001"]
+    finally:
+        lw.close()
+
+
+def test_legacy_pickle_index_is_removed_unread(tmp_path):
+    (tmp_path / "a.csv").write_text("cid\nx1\n", encoding="utf-8")
+    legacy = tmp_path / ".skip_index.pkl"
+    legacy.write_bytes(b"not a pickle")  # 読まれたら壊れている
+    assert csv_dedupe.load_skip_cids_in_dir(str(tmp_path)) == {"x1"}
+    assert not legacy.exists()
+    assert (tmp_path / csv_dedupe.SKIP_INDEX_NAME).exists()
+
+
+def _write_mixed(path):
+    with open(path, "w", encoding="utf-8-sig", newline="") as f:
+        w = csv.writer(f)
+        w.writerow(["cid", "title", "content"])
+        w.writerow(["abc00001", "t1", "one\nline"])
+        w.writerow(["  00123 ", "数字だけ", ""])  # 先頭ゼロ・前後空白
+        w.writerow(["", "空", "x"])
+        w.writerow(["   ", "空白だけ", "x"])
+        w.writerow(["abc00001", "重複", "x"])
+        w.writerow(["日本語cid", "t", "a, b"])
+
+
+def test_read_column_values_pyarrow_and_csv_agree(tmp_path, monkeypatch):
+    pytest.importorskip("pyarrow")
+    path = tmp_path / "mixed.csv"
+    _write_mixed(path)
+    via_arrow = csv_dedupe._read_column_values(str(path), "cid")
+    monkeypatch.setattr(csv_dedupe, "pacsv", None)
+    via_csv = csv_dedupe._read_column_values(str(path), "cid")
+    assert via_arrow == via_csv == {"abc00001", "00123", "日本語cid"}
+
+
+def test_read_column_values_adds_into_given_set(tmp_path):
+    path = tmp_path / "mixed.csv"
+    _write_mixed(path)
+    out = {"pre"}
+    assert csv_dedupe._read_column_values(str(path), "cid", out=out) is out
+    assert out == {"pre", "abc00001", "00123", "日本語cid"}
+
+
+def test_skip_index_roundtrip(tmp_path):
+    idx = {
+        "a.csv": (1700000000.123456, 42, frozenset({"x1", "x2"})),
+        "b.csv": (1700000001.0, 0, frozenset()),
+    }
+    csv_dedupe._save_skip_index(str(tmp_path), idx)
+    assert csv_dedupe._load_skip_index(str(tmp_path)) == idx
+
+
+@pytest.mark.parametrize("doc", [
+    '{"version": 2, "files": {}}',
+    '{"version": 1, "files": []}',
+    '{"version": 1, "files": {"a.csv": [1, 2]}}',
+    '{"version": 1, "files": {"a.csv": [1, "2", ["x"]]}}',
+    '{"version": 1, "files": {"a.csv": [1, 2, [3]]}}',
+    '[1, 2, 3]',
+    'not json',
+])
+def test_skip_index_rejects_bad_schema(tmp_path, doc):
+    (tmp_path / csv_dedupe.SKIP_INDEX_NAME).write_text(doc, encoding="utf-8")
+    assert csv_dedupe._load_skip_index(str(tmp_path)) == {}
+
+
+def test_skip_index_reused_for_unchanged_files(tmp_path, monkeypatch):
+    (tmp_path / "a.csv").write_text("cid\nx1\nx2\n", encoding="utf-8")
+    assert csv_dedupe.load_skip_cids_in_dir(str(tmp_path)) == {"x1", "x2"}
+    # プロセス内キャッシュを捨て、永続インデックスだけで CSV を読まずに返せること
+    csv_dedupe._CSV_CACHE.clear()
+
+    def _no_parse(*a, **kw):
+        raise AssertionError("unchanged CSV was re-parsed")
+
+    monkeypatch.setattr(csv_dedupe, "_read_cids_from_csv", _no_parse)
+    assert csv_dedupe.load_skip_cids_in_dir(str(tmp_path)) == {"x1", "x2"}
@@ -0,0 +1,18 @@
+from app.providers import fanza
+
+
+def test_now_printing_needles_match_baseline():
+    # 従来どおり "now_printing" 全体で判定（"now_print" だけでは拾わない）
+    assert fanza._is_now_printing_url_like("https://pics.dmm.co.jp/mono/movie/now_printing.jpg")
+    assert not fanza._is_now_printing_url_like("https://pics.dmm.co.jp/x/now_print_s.jpg")
+    assert fanza._fast_placeholder_heuristic("https://pics.dmm.co.jp/x/now_print_s.jpg")
+
+
+def test_head_final_url_needles_exclude_nopic(monkeypatch):
+    class _Resp:
+        url = "https://pics.dmm.co.jp/x/nopic_thumb.jpg"
+        headers = {"Content-Length": "50000"}
+
+    monkeypatch.setattr(fanza._SESSION, "head", lambda *a, **kw: _Resp())
+    # リダイレクト先の判定は従来の4語だけ（nopic/noimg は見ない）
+    assert not fanza._probe_is_placeholder("https://pics.dmm.co.jp/x/abc00001pl.jpg")
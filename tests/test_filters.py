@@ -0,0 +1,49 @@
+import re
+
+import pytest
+
+from app.core.filters import _compile_union
+
+
+def _baseline(patterns, text):
+    # 従来実装（_match_any）: パターンごとに re.search(p, text, re.I)
+    return any(re.search(p, text or "", re.I) for p in (patterns or []))
+
+
+@pytest.mark.parametrize("patterns", [
+    [""],
+    ["zz", ""],
+])
+@pytest.mark.parametrize("text", ["", "abc"])
+def test_empty_pattern_matches_everything(patterns, text):
+    assert bool(_compile_union(patterns)(text)) == _baseline(patterns, text)
+
+
+PATTERNS = [
+    ["S1", "ムーディーズ"],
+    [r"(a)x", r"(b)\1"],               # 後方参照は自分のグループを指す
+    [r"(?P<n>z)(?P=n)", r"(?P<n>y)"],  # 同名グループが複数あっても各自で判定
+    [r"(?i)abc", "DEF"],               # 先頭インラインフラグ
+    [r"(?s)a.b", r"(?x) q  r "],
+    [r"^abc$", r"\d{3}"],
+    [r"(x)?(?(1)a|b)", "zz"],
+    ["単体", "企画|素人"],
+]
+TEXTS = ["", "S1 NO.1 STYLE", "ムーディーズ", "ax", "bb", "b", "zz", "y", "ABC", "def", "a\nb", "qr", "abc", "x123",
+         "単体作品", "素人"]
+
+
+@pytest.mark.parametrize("patterns", PATTERNS)
+@pytest.mark.parametrize("text", TEXTS)
+def test_compile_union_matches_baseline(patterns, text):
+    assert bool(_compile_union(patterns)(text)) == _baseline(patterns, text)
+
+
+def test_compile_union_none_when_no_patterns():
+    assert _compile_union(None) is None
+    assert _compile_union([]) is None
+
+
+def test_invalid_pattern_still_raises():
+    with pytest.raises(re.error):
+        _compile_union(["ok", "(unclosed"])
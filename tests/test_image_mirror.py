@@ -0,0 +1,42 @@
+import io
+import os
+
+from app.core import image_mirror
+
+
+def test_blob_put_failure_leaves_no_meta(tmp_path, monkeypatch):
+    monkeypatch.setattr(image_mirror, "BLOB_DIR", str(tmp_path))
+    url = "https://pics.dmm.co.jp/x/abc00001pl.jpg"
+
+    class _Broken(io.BytesIO):
+        def read(self, *a):
+            raise OSError("disk full")
+
+    image_mirror._blob_put(url, _Broken(b"x"), "image/jpeg", "h1")
+    assert image_mirror._blob_get(url) is None
+    leftovers = [n for _, _, fs in os.walk(tmp_path) for n in fs]
+    assert leftovers == []
+
+
+def test_blob_put_roundtrip(tmp_path, monkeypatch):
+    monkeypatch.setattr(image_mirror, "BLOB_DIR", str(tmp_path))
+    url = "https://pics.dmm.co.jp/x/abc00002pl.jpg"
+    image_mirror._blob_put(url, io.BytesIO(b"jpegdata"), "image/jpeg", "h2")
+    fobj, ctype, hashhex, n = image_mirror._blob_get(url)
+    with fobj:
+        assert (fobj.read(), ctype, hashhex, n) == (b"jpegdata", "image/jpeg", "h2", 8)
+
+
+def test_blob_evict_removes_stale_tmp(tmp_path, monkeypatch):
+    monkeypatch.setattr(image_mirror, "BLOB_DIR", str(tmp_path))
+    sub = tmp_path / "ab"
+    sub.mkdir()
+    stale = sub / "abcd.123.tmp"
+    fresh = sub / "abce.456.tmp"
+    stale.write_bytes(b"x" * 10)
+    fresh.write_bytes(b"x" * 10)
+    old = os.path.getmtime(stale) - image_mirror.BLOB_TMP_STALE_SEC - 10
+    os.utime(stale, (old, old))
+    image_mirror._blob_evict()
+    assert not stale.exists()
+    assert fresh.exists()
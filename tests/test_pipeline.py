@@ -0,0 +1,82 @@
+import requests
+
+from app.core import pipeline
+from app.providers import fanza
+
+URL = "https://pics.dmm.co.jp/digital/video/abc00001/abc00001pl.jpg"
+
+
+class _Resp:
+    def __init__(self, status, length):
+        self.status_code = status
+        self.url = URL
+        self.headers = {"Content-Length": str(length)}
+
+
+def _fake_head(responses, calls):
+    def head(u, **kw):
+        calls.append(u)
+        r = responses.pop(0)
+        if isinstance(r, Exception):
+            raise r
+        return r
+    return head
+
+
+def test_probe_memo_skips_transient_failures(monkeypatch):
+    calls = []
+    monkeypatch.setattr(fanza._SESSION, "head", _fake_head(
+        [requests.ReadTimeout(), _Resp(503, 100), _Resp(200, 50000)], calls))
+    memo = {}
+    # タイムアウト・5xx は覚えない → 次に見た時に HEAD し直す
+    assert pipeline._probe_cached(URL, 1.0, True, True, memo) is False
+    assert pipeline._probe_cached(URL, 1.0, True, True, memo) is True  # 従来どおり小さい応答は placeholder
+    assert memo == {}
+    assert pipeline._probe_cached(URL, 1.0, True, True, memo) is False
+    assert memo == {URL: False}
+    # 確定した結果はメモから返る
+    assert pipeline._probe_cached(URL, 1.0, True, True, memo) is False
+    assert len(calls) == 3
+
+
+def test_filter_options_probe_memo_is_per_call():
+    class _Args:
+        min_samples = 0
+        release_after = None
+        verify_images = True
+        skip_placeholder = False
+
+    memo = {}
+    _, expand = pipeline._filter_options(_Args(), probe_memo=memo)
+    assert expand["probe_memo"] is memo
+
+
+def test_row_spool_matches_dictwriter(tmp_path):
+    import csv
+
+    class _Obj:
+        def __str__(self):
+            return "obj!"
+
+    rows = [
+        {"cid": "abc00001", "title": "T,1\n改行", "genres": ("a", "b"), "aspect_ratio": 1.5, 7: None},
+        {"cid": "abc00002", "content": "<p>x</p>", "player_width": 720, "flag": True, "extra": _Obj()},
+    ]
+    spool = pipeline._RowSpool()
+    try:
+        for r in rows:
+            spool.add(r)
+        got_path = tmp_path / "spool.csv"
+        spool.write_csv(str(got_path))
+    finally:
+        spool.close()
+
+    with open(got_path, encoding="utf-8-sig", newline="") as f:
+        fieldnames = next(csv.reader(f))
+    keys = {str(k): k for r in rows for k in r}
+    want_path = tmp_path / "want.csv"
+    with open(want_path, "w", encoding="utf-8-sig", newline="") as f:
+        w = csv.DictWriter(f, fieldnames=[keys[c] for c in fieldnames])
+        w.writeheader()
+        w.writerows(rows)
+    assert got_path.read_bytes() == want_path.read_bytes()
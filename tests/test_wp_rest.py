@@ -0,0 +1,150 @@
+from email.utils import format_datetime
+from datetime import datetime, timedelta, timezone
+
+import pytest
+import requests
+
+from app.core import wp_rest
+from app.core.wp_rest import WPClient
+
+
+class FakeWP:
+    """WPClient._req の差し替え。投稿は external_id -> ID の dict に持つ。"""
+
+    def __init__(self, batch_mode):
+        self.batch_mode = batch_mode
+        self.db = {}
+        self.calls = []
+        self._next = 100
+
+    def _new_id(self):
+        self._next += 1
+        return self._next
+
+    def __call__(self, method, path, tries=5, **kw):
+        self.calls.append((method, path.split("?")[0]))
+        if method == "GET":
+            eid = path.split("meta_value=")[1].split("&")[0]
+            return [{"id": self.db[eid], "meta": {"external_id": eid}}] if eid in self.db else []
+        if path == "/wp-json/batch/v1":
+            return self._batch(kw["json"]["requests"])
+        body = kw["json"]
+        eid = body["meta"]["external_id"]
+        if path.endswith("/posts"):
+            self.db[eid] = self._new_id()
+        return {"id": self.db[eid], "link": "single"}
+
+    def _batch(self, reqs):
+        if self.batch_mode in (404, 500):
+            r = requests.Response()
+            r.status_code = self.batch_mode
+            raise requests.HTTPError(response=r)
+        if self.batch_mode == "not_allowed":
+            return {"responses": [{"status": 400, "body": {"code": "rest_batch_not_allowed"}} for _ in reqs]}
+        out = []
+        for r in reqs:
+            eid = r["body"]["meta"]["external_id"]
+            if r["path"] == "/wp/v2/posts":
+                self.db[eid] = self._new_id()
+            out.append({"status": 201, "body": {"id": self.db[eid], "link": f"batch{self.db[eid]}"}})
+        if self.batch_mode == "timeout":
+            raise requests.ReadTimeout()  # WP 側では作成済み
+        return {"responses": out}
+
+
+def _items(*eids):
+    return [dict(title=e, content="c", status="draft", categories=[], tags=[], external_id=e) for e in eids]
+
+
+def _client(mode):
+    c = WPClient("https://wp.example", "u", "p")
+    fake = FakeWP(mode)
+    c._req = fake
+    return c, fake
+
+
+def _posts(fake):
+    return [p for m, p in fake.calls if m == "POST"]
+
+
+def test_batch_ok():
+    c, fake = _client("ok")
+    res = c.create_or_update_posts(_items("a", "b"))
+    assert [link for _, link in res] == ["batch101", "batch102"]
+    assert _posts(fake) == ["/wp-json/batch/v1"]
+    assert c._post_batch_ok
+
+
+@pytest.mark.parametrize("mode", ["not_allowed", 404])
+def test_batch_refused_falls_back_and_stays_off(mode):
+    c, fake = _client(mode)
+    res = c.create_or_update_posts(_items("a", "b"))
+    assert [link for _, link in res] == ["single", "single"]
+    assert not c._post_batch_ok
+    assert _posts(fake) == ["/wp-json/batch/v1", "/wp-json/wp/v2/posts", "/wp-json/wp/v2/posts"]
+    # 以降の呼び出しは batch を試さない
+    c.create_or_update_posts(_items("c"))
+    assert _posts(fake)[-1] == "/wp-json/wp/v2/posts"
+    assert _posts(fake).count("/wp-json/batch/v1") == 1
+
+
+def test_batch_5xx_keeps_batching_on():
+    c, fake = _client(500)
+    res = c.create_or_update_posts(_items("a"))
+    assert res == [(101, "single")]
+    assert c._post_batch_ok
+
+
+def test_ambiguous_batch_failure_updates_instead_of_duplicating():
+    c, fake = _client("timeout")
+    res = c.create_or_update_posts(_items("a", "b"))
+    # batch で作成済みの投稿は存在確認し直して更新になる（新規作成しない）
+    assert [pid for pid, _ in res] == [101, 102]
+    assert _posts(fake)[1:] == ["/wp-json/wp/v2/posts/101", "/wp-json/wp/v2/posts/102"]
+    assert fake.db == {"a": 101, "b": 102}
+
+
+class _R:
+    def __init__(self, headers):
+        self.headers = headers
+
+
+def test_retry_after_seconds_and_date():
+    assert wp_rest._retry_after(_R({"Retry-After": "7"})) == 7.0
+    future = format_datetime(datetime.now(timezone.utc) + timedelta(seconds=30), usegmt=True)
+    assert 25 <= wp_rest._retry_after(_R({"Retry-After": future})) <= 30
+    assert wp_rest._retry_after(_R({"Retry-After": "Wed, 21 Oct 2015 07:28:00 GMT"})) == 0.0
+    assert wp_rest._retry_after(_R({"Retry-After": "soon"})) is None
+    assert wp_rest._retry_after(_R({})) is None
+
+
+def test_retry_delay_full_jitter_bounds(monkeypatch):
+    monkeypatch.setattr(wp_rest.random, "uniform", lambda a, b: b)  # 上限側
+    assert wp_rest._retry_delay(_R({}), 0) == wp_rest.RETRY_BASE
+    assert wp_rest._retry_delay(_R({}), 10) == wp_rest.RETRY_CAP
+    monkeypatch.setattr(wp_rest.random, "uniform", lambda a, b: a)  # 下限側
+    assert wp_rest._retry_delay(_R({}), 3) == 0
+    # Retry-After は下限（ただし RETRY_AFTER_MAX で頭打ち）
+    assert wp_rest._retry_delay(_R({"Retry-After": "12"}), 0) == 12
+    assert wp_rest._retry_delay(_R({"Retry-After": "99999"}), 0) == wp_rest.RETRY_AFTER_MAX
+
+
+def test_req_retries_then_raises(monkeypatch):
+    sleeps = []
+    monkeypatch.setattr(wp_rest.time, "sleep", sleeps.append)
+    monkeypatch.setattr(wp_rest.random, "uniform", lambda a, b: a)
+    c = WPClient("https://wp.example", "u", "p")
+
+    def _resp(status):
+        r = requests.Response()
+        r.status_code = status
+        r.headers["Retry-After"] = "2"
+        r._content = b"{}"
+        r.url = "https://wp.example/x"
+        return r
+
+    seq = [_resp(503), _resp(429), _resp(503)]
+    monkeypatch.setattr(c.session, "request", lambda *a, **kw: seq.pop(0))
+    with pytest.raises(requests.HTTPError):
+        c._req("GET", "/x", tries=3)
+    assert sleeps == [2.0, 2.0]  # 最後の試行の後は待たない